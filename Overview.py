@@ -3,28 +3,70 @@ import streamlit as st
 import pandas as pd
 from io import BytesIO
 
-# Allow the content to be spread across the whole page
+from utils.jobs import run_cached, run_in_background, wait_for_job
+from utils.samples import sample_filter_sidebar, select_samples, show_sample_report
+from utils.search import search_index, search_rows, subset_rows
+from utils.snapshot import snapshot_sidebar
+from utils.summary import SUMMARY_COLUMNS, compute_row_summary, normalize_dataset, row_statistic_order, row_summary
+from utils.taxonomy import METAPHLAN_LEVELS, rollup_taxonomy, taxonomy_tree
+
+# Allow the content to be spread across the whole page
 st.set_page_config(layout="wide")
 
+# Number of rows shown while the whole table is loading
+PREVIEW_ROWS = 100
+
+# Number of rows parsed at once when loading the whole table
+LOAD_CHUNK_ROWS = 50000
+
 
 # Function for loading data from .tsv file
-def load_data(file, file_name):
+def load_data(file, file_name, nrows=None):
     """Converts loaded file from bytes format to  Pandas DataFrame. 
 
     Args:
         file (bytes): Loaded file from file_uploader 
         file_name (str): Name of uploaded file
+        nrows (int, optional): Number of rows to read, whole file by default
 
     Returns:
         DataFrame: Loaded file in the form of DataFrame
     """
     if "metaphlan" in file_name:
-        dataset = pd.read_csv(BytesIO(file), sep="\t", index_col=0, skiprows=1)
+        dataset = pd.read_csv(BytesIO(file), sep="\t", index_col=0, skiprows=1, nrows=nrows)
         dataset.index.name = "Taxa"
     else:
-        dataset = pd.read_csv(BytesIO(file), sep="\t", index_col=0)
+        dataset = pd.read_csv(BytesIO(file), sep="\t", index_col=0, nrows=nrows)
     return dataset
 
+# Function for loading whole table in the background
+def loadTable(job, file, file_name):
+    """Parses the file by chunks of rows and prepares row statistics.
+
+    Args:
+        job (Job): Background job used to report progress
+        file (bytes): Loaded file from file_uploader
+        file_name (str): Name of uploaded file
+
+    Returns:
+        dict: Whole table (dataset) and its row statistics (summary)
+    """
+    total_rows = max(file.count(b"\n") - 1, 1)
+    skiprows = 1 if "metaphlan" in file_name else 0
+
+    chunks = []
+    for chunk in pd.read_csv(BytesIO(file), sep="\t", index_col=0, skiprows=skiprows, chunksize=LOAD_CHUNK_ROWS):
+        chunks.append(chunk)
+        parsed = sum(len(chunk) for chunk in chunks)
+        job.report(0.8 * min(parsed / total_rows, 1), f"Parsed {parsed} of about {total_rows} rows...")
+    dataset = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+    if "metaphlan" in file_name:
+        dataset.index.name = "Taxa"
+
+    job.report(0.8, "Summarizing rows...")
+    return {"dataset": dataset,
+            "summary": compute_row_summary(dataset)}
+
 # Function to split dataset for pagination
 def split_frame(input_df, rows):
     """Takes whole DataFrame and returns list of DataFrames. These DataFrames
@@ -40,50 +82,21 @@ def split_frame(input_df, rows):
     split_df = [input_df.iloc[i : i + rows - 1, :] for i in range(0, len(input_df), rows)]
     return split_df
 
-# Function to create normalized dataset
-def normalize_dataset(table):
-    """Whole input table is normalized to percentage by columns.
-
-    Args:
-        table (DataFrame): Whole uploaded table (file)
-
-    Returns:
-        DataFrame: Normalized table
-    """
-    for column in table.columns:
-        table[column] = (table[column]/table[column].sum())*100
-    return table
-
-# Function to turn on and off Mean abundance checkbox
-def toggle_box(): st.session_state.box_value = not st.session_state.box_value
-
 def metaphlanTaxonomy(dataframe, taxonomy_level):
-    """Function selects rows based on taxonomic level.
+    """Function aggregates rows to selected taxonomic level using the taxonomy tree index.
 
     Args:
         dataframe (DataFrame): Whole table (file)
         taxonomy_level (str): Selected taxonomic level
 
     Returns:
-        DataFrame: DataFrame with only rows on selected taxonomic level.
+        DataFrame: DataFrame with rows rolled up to selected taxonomic level.
     """
-    match taxonomy_level:
-        case "Taxonomic Level 1 (Kingdom)":
-            selection = dataframe[dataframe.index.str.contains("k__") & ~dataframe.index.str.contains("p__")]
-        case "Taxonomic Level 2 (Phylum)":
-            selection = dataframe[dataframe.index.str.contains("p__") & ~dataframe.index.str.contains("c__")]
-        case "Taxonomic Level 3 (Class)":
-            selection = dataframe[dataframe.index.str.contains("c__") & ~dataframe.index.str.contains("o__")]
-        case "Taxonomic Level 4 (Order)":
-            selection = dataframe[dataframe.index.str.contains("o__") & ~dataframe.index.str.contains("f__")]
-        case "Taxonomic Level 5 (Family)":
-            selection = dataframe[dataframe.index.str.contains("f__") & ~dataframe.index.str.contains("g__")]
-        case "Taxonomic Level 6 (Genus)":
-            selection = dataframe[dataframe.index.str.contains("g__") & ~dataframe.index.str.contains("s__")]
-        case "Taxonomic Level 7 (Species)":
-            selection = dataframe[dataframe.index.str.contains("s__") & ~dataframe.index.str.contains("t__")]
-        case "Taxonomic Level 8 (All)":
-            selection = dataframe
+    if taxonomy_level == "Taxonomic Level 8 (All)":
+        return dataframe
+
+    lineages, _ = taxonomy_tree(dataframe.index)
+    selection = rollup_taxonomy(dataframe, lineages, METAPHLAN_LEVELS[taxonomy_level])
     
     return selection
 
@@ -123,51 +136,52 @@ if st.session_state.uploaded_files:
     with st.sidebar:
         select_file = st.selectbox("Select file:", options=file_names)
 
+    # Export and restore of computed results
+    snapshot_sidebar()
 
     file = st.session_state.uploaded_files[select_file]
-    dataset = load_data(file, select_file)
-    
-    # Copy loaded dataset to variable for dataset to show 
-    selected_df = dataset
-    
-    # Session state variable for disabling Mean column checkbox 
-    if "box_value" not in st.session_state:
-        st.session_state.box_value = False
 
     st.title("Overview")
 
+    # Parse whole table in the background, first rows are shown until it is loaded
+    load_job = run_in_background("overview_table", loadTable, file, select_file)
+    loaded = wait_for_job(load_job, "Loading table...")
+
+    if loaded is None:
+        preview = load_data(file, select_file, nrows=PREVIEW_ROWS)
+        st.caption(f"Showing first {len(preview)} rows. Sorting, filtering and search are enabled when the whole table is loaded.")
+        st.dataframe(data=preview, use_container_width=True)
+        st.stop()
+
+    # Samples are selected once, rows stay the same as in the whole table
+    dataset = select_samples(loaded["dataset"], st.session_state.get("metadata"), sample_filter_sidebar())
+    show_sample_report(loaded["dataset"], dataset)
+    
+    # Copy loaded dataset to variable for dataset to show 
+    selected_df = dataset
+
     # Initialize top menu
     top_menu = st.columns(4)
 
     with top_menu[2]:
-        # Manage column with mean abundance
-        add_mean_abundance = st.checkbox("Mean abundance", disabled=st.session_state.box_value, value=False, help="Adds column with mean abundance per taxon (per row)")
+        # Manage columns with precomputed row statistics
+        row_statistics = st.multiselect("Row statistics", options=SUMMARY_COLUMNS, help="Adds columns with statistics per taxon (per row), prevalence is fraction of samples with non-zero abundance")
         
-        # Normalize dataset
+        # Normalize dataset
         if "metaphlan" in select_file:
-            normalize = st.checkbox("Normalize", value=False, disabled=True, on_change=toggle_box, help="Normalize columns to relative abundance of taxons per sample (percentage)")
+            normalize = st.checkbox("Normalize", value=False, disabled=True, help="Normalize columns to relative abundance of taxons per sample (percentage)")
         else:    
-            normalize = st.checkbox("Normalize", value=False, on_change=toggle_box, help="Normalize columns to relative abundance of taxons per sample (percentage)")
+            normalize = st.checkbox("Normalize", value=False, help="Normalize columns to relative abundance of taxons per sample (percentage)")
 
         # Conditions to toggle normalization
         if normalize == True:
-            selected_df = normalize_dataset(selected_df)
+            selected_df = run_cached(normalize_dataset, selected_df)
         if normalize == False:
             selected_df = selected_df
 
-        # Condition to toggle mean abundance
-        if add_mean_abundance == True:
-            selected_df["Mean abundance"] = selected_df.mean(axis=1)
-
-        if add_mean_abundance == False and "Mean abundance" in selected_df.columns:
-            selected_df = selected_df.drop("Mean abundance", axis=1)
-        
-        if st.session_state.box_value == True and "Mean abundance" in selected_df.columns:
-            selected_df = selected_df.drop("Mean abundance", axis=1)
-
     # Select box to choose by which column to sort
     with top_menu[0]:
-        columnsNames = selected_df.columns.to_list()
+        columnsNames = selected_df.columns.to_list() + SUMMARY_COLUMNS
         columnsNames.append(selected_df.index.name)
 
         sort_field = st.selectbox("Sort By", options=columnsNames, index=len(columnsNames)-1)
@@ -175,9 +189,6 @@ if st.session_state.uploaded_files:
     # Radio buttons for sorting direction
     with top_menu[1]:
         sort_direction = st.radio("Direction", options=["⬆️", "⬇️"], horizontal=True)
-
-        # Sort selected dataset
-        selected_df = selected_df.sort_values(by=sort_field, ascending=sort_direction == "⬆️")
     
     # Select taxonomic level
     with top_menu[3]:
@@ -202,6 +213,37 @@ if st.session_state.uploaded_files:
                 case "Genus & Species":
                     selected_df = selected_df[selected_df.index.str.contains("g__")==True]
 
+    # Search in row names
+    search_menu = st.columns((3, 1))
+
+    with search_menu[0]:
+        search_query = st.text_input("Search", placeholder="UniRef90_..., PWY-..., s__...", help="Shows only rows whose name contains the text (case insensitive).")
+
+    with search_menu[1]:
+        search_mode = st.radio("Match", options=["Substring", "Prefix"], horizontal=True)
+
+    # Statistics per row, computed once per dataset, normalization and level (whole table is prepared while loading)
+    summary = loaded["summary"] if selected_df is loaded["dataset"] else row_summary(selected_df)
+
+    # Keep only rows matching the query, index over row names of the whole table is built on
+    # the first search and shared by normalized, filtered and rolled-up tables with the same names
+    if search_query.strip():
+        matching_rows = subset_rows(search_rows(search_index(loaded["dataset"].index), search_query, search_mode),
+                                    loaded["dataset"].index, selected_df.index)
+        if matching_rows is None:
+            matching_rows = search_rows(search_index(selected_df.index), search_query, search_mode)
+        selected_df, summary = selected_df.iloc[matching_rows], summary.iloc[matching_rows]
+        st.markdown(f"Found **{len(matching_rows)}** matching rows")
+
+    # Sort selected dataset (after taxonomic roll-up so the order is kept), rows and their
+    # statistics are matched by position because row names may repeat
+    if sort_field in SUMMARY_COLUMNS:
+        order = row_statistic_order(summary, sort_field, ascending=sort_direction == "⬆️")
+    else:
+        sort_values = selected_df.index.to_series() if sort_field == selected_df.index.name else selected_df[sort_field]
+        order = pd.Series(sort_values.to_numpy()).sort_values(ascending=sort_direction == "⬆️").index.to_numpy()
+    selected_df, summary = selected_df.iloc[order], summary.iloc[order]
+
 
     # Set up container for dataset
     pagination = st.container()
@@ -226,11 +268,14 @@ if st.session_state.uploaded_files:
     with bottom_menu[0]:
         st.markdown(f"Page **{current_page}** of **{total_pages}** ")
     
-    # Split dataset to pages
-    pages = split_frame(selected_df, batch_size)
+    # Split dataset to pages (one empty page if nothing matches the search)
+    pages = split_frame(selected_df, batch_size) or [selected_df]
 
     # Print dataset on the page
-    pagination.dataframe(data=pages[current_page - 1], use_container_width=True)
+    page = pages[current_page - 1]
+    first_row = (current_page - 1) * batch_size
+    page = page.assign(**{statistic: summary[statistic].to_numpy()[first_row:first_row + len(page)] for statistic in row_statistics})
+    pagination.dataframe(data=page, use_container_width=True)
 
     
 
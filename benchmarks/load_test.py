@@ -0,0 +1,189 @@
+# Load test of the dashboard with concurrent simulated sessions
+import argparse
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from synthetic import write_dataset
+
+
+# Pages and their tabs (radio key and options) driven by the sessions
+PAGES = {"Overview.py": None,
+         "pages/1_Graphs.py": ("graphs_tab", ["Heatmap", "Barplots", "Contributions", "Taxonomy"]),
+         "pages/2_Statistics.py": ("statistics_tab", ["Alpha Diversity", "Beta Diversity", "Co-occurrence Network", "Differential Expression"])}
+
+# Longest time a session waits for background jobs after one interaction
+SETTLE_TIMEOUT = 120
+
+# AppTest keeps the runtime in process-global state, so script runs of sessions take turns.
+# Background jobs of the sessions still run in parallel in the shared job runner.
+_run_lock = threading.Lock()
+
+
+# Function to create scripted interactions with a page
+def scripted_steps(page, file_names):
+    """Returns interactions of one session: selecting every file and every tab of the page,
+    Overview additionally searches in row names.
+
+    Returns:
+        list: Pairs of label and function changing widgets of the AppTest
+    """
+    steps = []
+    for file_name in file_names:
+        steps.append((f"select {file_name}", lambda at, name=file_name: at.sidebar.selectbox[0].set_value(name)))
+        if PAGES[page] is None:
+            steps.append(("search", lambda at: at.text_input[0].input("00")))
+            steps.append(("clear search", lambda at: at.text_input[0].input("")))
+        else:
+            key, tabs = PAGES[page]
+            steps.extend((f"tab {tab}", lambda at, key=key, tab=tab: at.radio(key=key).set_value(tab)) for tab in tabs)
+    return steps
+
+
+# Function to rerun the page, latency includes waiting for other sessions
+def _rerun(at):
+    start = time.perf_counter()
+    with _run_lock:
+        at.run()
+    return time.perf_counter() - start
+
+
+# Function to run the page once and wait until its background jobs finish
+def timed_run(at):
+    """Reruns the page like the browser does, then reruns while a progress bar is shown.
+
+    Returns:
+        list: Latencies of all reruns in seconds
+    """
+    deadline = time.perf_counter() + SETTLE_TIMEOUT
+    latencies = [_rerun(at)]
+
+    # Progress bars are shown by running jobs, the page reruns every 0.5 s until they finish
+    while at.get("progress") and time.perf_counter() < deadline:
+        time.sleep(0.5)
+        latencies.append(_rerun(at))
+
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return latencies
+
+
+# Function to create session with uploaded files
+def new_session(page, files, metadata):
+    at = AppTest.from_file(str(ROOT / page), default_timeout=SETTLE_TIMEOUT)
+    at.session_state["uploaded_files"] = dict(files)
+    at.session_state["metadata"] = metadata
+    at.session_state["metadata_uploaded"] = True
+    return at
+
+
+# Function to simulate concurrent sessions on one page
+def run_sessions(page, n_sessions, files, metadata):
+    """Runs n_sessions sessions in parallel threads, every session performs all scripted
+    steps. Sessions share the caches and the job runner like sessions of one server, their
+    script runs are serialized like runs competing for the GIL of one server process.
+
+    Returns:
+        tuple: Latencies of all reruns, wall time and the sessions (kept for memory measurement)
+    """
+    steps = scripted_steps(page, list(files))
+    sessions = [new_session(page, files, metadata) for _ in range(n_sessions)]
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def session_worker(at):
+        session_latencies = []
+        try:
+            session_latencies.extend(timed_run(at))
+            for _, step in steps:
+                step(at)
+                session_latencies.extend(timed_run(at))
+        except Exception as error:
+            errors.append(error)
+        with lock:
+            latencies.extend(session_latencies)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session_worker, args=(at,)) for at in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {n_sessions} sessions failed on {page}: {errors[0]}")
+    return latencies, wall_time, sessions
+
+
+# Function to measure memory of sessions
+def session_memory(page, n_sessions, files, metadata):
+    """Memory allocated by n_sessions sessions which stays allocated after their steps,
+    caches are filled by one session before the measurement so only memory of the
+    sessions themselves is counted.
+
+    Returns:
+        float: Allocated memory per session in bytes
+    """
+    run_sessions(page, 1, files, metadata)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        _, _, sessions = run_sessions(page, n_sessions, files, metadata)
+        allocated = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return allocated / n_sessions
+
+
+# Function to measure all pages with growing number of sessions
+def measure(session_counts, pages, files, metadata, memory=True):
+    """Runs every page with every number of concurrent sessions.
+
+    Returns:
+        DataFrame: p50/p95/max rerun latency, throughput and memory per session
+    """
+    results = []
+    for page in pages:
+        for n_sessions in session_counts:
+            latencies, wall_time, _ = run_sessions(page, n_sessions, files, metadata)
+            latencies = np.array(latencies)
+            results.append({"page": page,
+                            "sessions": n_sessions,
+                            "reruns": len(latencies),
+                            "p50 [s]": np.percentile(latencies, 50),
+                            "p95 [s]": np.percentile(latencies, 95),
+                            "max [s]": latencies.max(),
+                            "reruns/s": len(latencies) / wall_time,
+                            "MB/session": session_memory(page, n_sessions, files, metadata) / 2**20 if memory else np.nan})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure rerun latency, throughput and memory of the dashboard with concurrent sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8], help="Numbers of concurrent sessions")
+    parser.add_argument("--pages", nargs="+", default=list(PAGES), choices=list(PAGES), help="Pages to test")
+    parser.add_argument("--features", type=int, default=2000, help="Number of gene families of synthetic data")
+    parser.add_argument("--samples", type=int, default=50, help="Number of samples of synthetic data")
+    parser.add_argument("--no-memory", action="store_true", help="Skip memory measurement (tracemalloc slows the sessions down)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, args.features, args.samples, args.seed)
+        files = {path.name: path.read_bytes() for kind, path in paths.items() if kind != "metadata"}
+        metadata = pd.read_csv(paths["metadata"], sep="\t", index_col=0)
+
+    report = measure(args.sessions, args.pages, files, metadata, memory=not args.no_memory)
+    print(f"{args.features} features x {args.samples} samples")
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
@@ -0,0 +1,67 @@
+# Error and speed of sketch-based beta diversity compared with exact distances
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist, squareform
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from synthetic import synthetic_humann
+from utils.sketch import sample_sketches, sketch_distances, sketch_standard_error
+
+
+# Function to compare approximate and exact distances
+def measure(table, metric, sketch_sizes):
+    """Computes exact distances and their estimates from sketches of every size.
+
+    Returns:
+        DataFrame: Mean, 95th percentile and maximal absolute error and run times
+    """
+    values = table.to_numpy(dtype=float).T
+    start = time.perf_counter()
+    exact = squareform(pdist(values > 0 if metric == "jaccard" else values, metric=metric))
+    exact_time = time.perf_counter() - start
+
+    upper = np.triu_indices(len(values), k=1)
+    results = []
+    for sketch_size in sketch_sizes:
+        start = time.perf_counter()
+        sketches = sample_sketches(table, sketch_size, weighted=metric == "braycurtis")
+        approximate = sketch_distances(sketches, metric).to_numpy()
+        errors = np.abs(approximate - exact)[upper]
+        results.append({"metric": metric,
+                        "sketch size": sketch_size,
+                        "mean abs. error": errors.mean(),
+                        "p95 abs. error": np.percentile(errors, 95),
+                        "max abs. error": errors.max(),
+                        "expected SE bound": sketch_standard_error(sketch_size),
+                        "sketch time [s]": time.perf_counter() - start,
+                        "exact time [s]": exact_time})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure error of sketch-based beta diversity against exact distances.")
+    parser.add_argument("--table", help="Merged HUMAnN/MetaPhlAn table (.tsv), synthetic genefamilies table is used if not given")
+    parser.add_argument("--features", type=int, default=5000, help="Number of features of synthetic table")
+    parser.add_argument("--samples", type=int, default=200, help="Number of samples of synthetic table")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256, 512, 1024], help="Sketch sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.table:
+        skiprows = 1 if "metaphlan" in args.table else 0
+        table = pd.read_csv(args.table, sep="\t", index_col=0, skiprows=skiprows)
+    else:
+        table = synthetic_humann(args.features, args.samples, seed=args.seed)
+
+    # Samples without any abundance have no sketch
+    table = table.loc[:, table.sum() > 0]
+
+    report = pd.concat([measure(table, metric, args.sizes) for metric in ["jaccard", "braycurtis"]])
+    print(f"{table.shape[0]} features x {table.shape[1]} samples")
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
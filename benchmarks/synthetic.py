@@ -0,0 +1,135 @@
+# Generator of synthetic HUMAnN/MetaPhlAn tables for benchmarks
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Function to draw sparse abundances
+def _abundances(rng, n_rows, n_samples, sparsity):
+    values = rng.lognormal(mean=2.0, sigma=2.0, size=(n_rows, n_samples))
+    values[rng.random((n_rows, n_samples)) < sparsity] = 0
+    return values
+
+
+# Function to create sample names mapped to metadata by the part before "_"
+def sample_names(n_samples, suffix):
+    return [f"Sample{i + 1}_{suffix}" for i in range(n_samples)]
+
+
+# Function to create MetaPhlAn table
+def synthetic_metaphlan(n_species=500, n_samples=50, sparsity=0.6, seed=0):
+    """Creates MetaPhlAn-like table with rows on every rank pre-summed from species,
+    abundances are relative (percentage) per sample.
+
+    Returns:
+        DataFrame: Table indexed by lineage (Taxa)
+    """
+    rng = np.random.default_rng(seed)
+    ranks = ["k", "p", "c", "o", "f", "g", "s"]
+    branching = [2, 4, 3, 3, 3, 3]
+
+    # Assign every species to random ancestors with limited branching
+    lineages = []
+    for species in range(n_species):
+        parents = [rng.integers(0, width) for width in branching]
+        path = [f"{ranks[0]}__Kingdom{parents[0]}"]
+        for depth in range(1, len(ranks) - 1):
+            path.append(f"{ranks[depth]}__{ranks[depth].upper()}{'_'.join(str(p) for p in parents[:depth + 1])}")
+        path.append(f"s__Species{species}")
+        lineages.append("|".join(path))
+
+    species = pd.DataFrame(_abundances(rng, n_species, n_samples, sparsity), index=lineages,
+                           columns=sample_names(n_samples, "metaphlan_bugs_list"))
+    species = species / species.sum().replace(0, 1) * 100
+
+    # Add pre-summed rows of all higher ranks
+    tables = [species]
+    for depth in range(1, len(ranks)):
+        prefixes = species.index.str.split("|").str[:depth].str.join("|")
+        tables.append(species.groupby(prefixes).sum())
+    table = pd.concat(tables).sort_index()
+    table.index.name = "Taxa"
+    return table
+
+
+# Function to create HUMAnN table
+def synthetic_humann(n_features=2000, n_samples=50, sparsity=0.7, strata=3, seed=0, kind="genefamilies"):
+    """Creates HUMAnN-like genefamilies or pathabundance table with unstratified rows and
+    rows stratified by genus and species.
+
+    Returns:
+        DataFrame: Table indexed by feature (and stratum)
+    """
+    rng = np.random.default_rng(seed)
+    if kind == "genefamilies":
+        features = [f"UniRef90_{rng.integers(0, 16**6):06X}{i}" for i in range(n_features)]
+        suffix = "Abundance-RPKs"
+    else:
+        features = [f"PWY-{1000 + i}: synthetic pathway {i}" for i in range(n_features)]
+        suffix = "Abundance"
+
+    rows, values = [], []
+    for feature in features:
+        taxa = [f"g__Genus{g}.s__Genus{g}_species{rng.integers(0, 5)}" for g in rng.integers(0, 100, size=strata)]
+        taxa = list(dict.fromkeys(taxa)) + ["unclassified"]
+        stratified = _abundances(rng, len(taxa), n_samples, sparsity)
+        rows.append(feature)
+        values.append(stratified.sum(axis=0))
+        rows.extend(f"{feature}|{taxon}" for taxon in taxa)
+        values.extend(stratified)
+
+    table = pd.DataFrame(np.vstack(values), index=rows, columns=sample_names(n_samples, suffix))
+    table.loc["UNMAPPED"] = _abundances(rng, 1, n_samples, 0)[0] * 100
+    table.index.name = "# Gene Family" if kind == "genefamilies" else "# Pathway"
+    return table
+
+
+# Function to create metadata for the samples
+def synthetic_metadata(n_samples=50, seed=0):
+    rng = np.random.default_rng(seed)
+    metadata = pd.DataFrame({"SampleSource": rng.choice(["Stool", "Saliva", "Skin"], size=n_samples),
+                             "SampleMaterial": rng.choice(["DNA", "RNA"], size=n_samples),
+                             "SequencingKit": rng.choice(["KitA", "KitB"], size=n_samples)},
+                            index=[name.split("_")[0] for name in sample_names(n_samples, "x")])
+    metadata.index.name = "SampleName"
+    return metadata
+
+
+# Function to write all synthetic files to directory
+def write_dataset(directory, n_features=2000, n_samples=50, seed=0):
+    """Writes merged_metaphlan_bugs_lists.tsv, merged_genefamilies_tables.tsv,
+    merged_pathabundance_tables.tsv and metadata.tsv in formats accepted by the dashboard.
+
+    Returns:
+        dict: Paths of written files by kind
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = {"metaphlan": directory / "merged_metaphlan_bugs_lists.tsv",
+             "genefamilies": directory / "merged_genefamilies_tables.tsv",
+             "pathabundance": directory / "merged_pathabundance_tables.tsv",
+             "metadata": directory / "metadata.tsv"}
+
+    # MetaPhlAn merged tables start with a database line, the dashboard skips it
+    with open(paths["metaphlan"], "w") as file:
+        file.write("#mpa_synthetic\n")
+        synthetic_metaphlan(max(n_features // 4, 10), n_samples, seed=seed).to_csv(file, sep="\t")
+
+    synthetic_humann(n_features, n_samples, seed=seed, kind="genefamilies").to_csv(paths["genefamilies"], sep="\t")
+    synthetic_humann(max(n_features // 10, 10), n_samples, seed=seed, kind="pathabundance").to_csv(paths["pathabundance"], sep="\t")
+    synthetic_metadata(n_samples, seed=seed).to_csv(paths["metadata"], sep="\t")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic input files for the dashboard.")
+    parser.add_argument("directory", help="Output directory")
+    parser.add_argument("--features", type=int, default=2000, help="Number of gene families")
+    parser.add_argument("--samples", type=int, default=50, help="Number of samples")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for kind, path in write_dataset(args.directory, args.features, args.samples, args.seed).items():
+        print(f"{kind}: {path}")
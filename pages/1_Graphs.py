@@ -8,6 +8,17 @@ import dash_bio
 
 from io import BytesIO
 
+from utils.contributions import contribution_index, feature_contributions, taxon_features, top_contributors
+from utils.filtering import prefilter_features, prefilter_sidebar, show_prefilter_report
+from utils.heatmap import RASTER_HEIGHT, RASTER_MIN_CELLS, build_tile_pyramid, legend_table, raster_figure
+from utils.jobs import run_cached, run_in_background, run_interruptible, wait_for_job
+from utils.regroup import regroup_sidebar, regroup_table
+from utils.samples import sample_filter_sidebar, select_samples, show_sample_report
+from utils.search import search_index, search_rows
+from utils.snapshot import snapshot_sidebar
+from utils.summary import SUMMARY_COLUMNS, normalize_dataset, row_summary, sort_by_row_statistic
+from utils.taxonomy import METAPHLAN_LEVELS, RANK_NAMES, rollup_taxonomy, taxonomy_hierarchy, taxonomy_tree
+
 
 # Allow the content to be spread across the whole page
 st.set_page_config(layout="wide")
@@ -33,37 +44,6 @@ def load_data(file, file_name):
     return dataset
 
 
-# Function to create normalized dataset
-def normalize_dataset(table):
-    """Whole input table is normalized to percentage by columns.
-
-    Args:
-        table (DataFrame): Whole uploaded table (file)
-
-    Returns:
-        DataFrame: Normalized table
-    """
-    for column in table.columns:
-        table[column] = (table[column]/table[column].sum())*100
-    return table
-
-
-# Function to sort dataset by Mean Abundance 
-def sort_by_mean_abundance(dataframe):
-    """Takes whole DataFrame, adds column with mean abundance per row. Sorts DataFrame by this column.
-    Drops the mean abundance column.
-
-    Args:
-        dataframe (DataFrame): Selected DataFrame
-
-    Returns:
-        DataFrame: Sorted DataFrames by mean abundance 
-    """
-    dataframe = dataframe.assign(Mean_Abundance=dataframe.mean(axis=1))
-    dataframe = dataframe.sort_values("Mean_Abundance", ascending=False)
-    dataframe = dataframe.drop(columns="Mean_Abundance")
-    return dataframe
-
 def createBarplot(barplot_df, y_title):
     """Function that creates stacked barplot and prints it on the page.
 
@@ -106,33 +86,83 @@ def createBarplot(barplot_df, y_title):
                             )
     st.plotly_chart(fig, use_container_width=True)
 
+def computeClustergram(job, topTaxa, metric):
+    """Function that creates clustergram figure, runs in the background.
+
+    Args:
+        job (Job): Background job used to report progress
+        topTaxa (DataFrame): Selected rows to cluster
+        metric (str): Distance metric for the dendrograms
+
+    Returns:
+        Figure: Clustergram (heatmap with dendrograms)
+    """
+    job.report(0.1, f"Clustering {len(topTaxa)} rows and {len(topTaxa.columns)} columns...")
+
+    # Create figure for the heatmap (clustergram), clustering of large tables can be cancelled
+    fig = run_interruptible(
+        job, topTaxa.size, dash_bio.Clustergram,
+        data=topTaxa,
+        row_labels=list(range(1, len(topTaxa.index)+1)),
+        column_labels=list(topTaxa.columns),
+        height=1200,
+        color_map="sunset",
+        row_dist=metric,
+        col_dist=metric
+    )
+    return fig
+
+def heatmapLegend(row_names):
+    """Function that prints searchable table of heatmap rows, only visible part of the table is rendered.
+
+    Args:
+        row_names (list): Names of rows in order of row numbers in the heatmap
+    """
+    st.write("### Legend:")
+    query = st.text_input("Search legend:", key="heatmap_legend_search", help="Shows only rows whose name contains the text.")
+
+    legend = legend_table(row_names)
+    if query:
+        legend = legend.iloc[search_rows(search_index(pd.Index(row_names)), query)]
+    st.dataframe(legend, hide_index=True, use_container_width=True)
+
+def createTaxonomyChart(hierarchy, chart_type):
+    """Function that creates sunburst or treemap of taxonomy tree and prints it on the page.
+
+    Args:
+        hierarchy (DataFrame): Nodes with Name, Parent and Value columns from taxonomy_hierarchy
+        chart_type (str): "Sunburst" or "Treemap"
+    """
+    # Plotly needs values without children, otherwise rounding can hide whole branches
+    children_sum = hierarchy.groupby("Parent")["Value"].sum()
+    own_values = (hierarchy["Value"] - children_sum.reindex(hierarchy.index, fill_value=0)).clip(lower=0)
+
+    chart = go.Sunburst if chart_type == "Sunburst" else go.Treemap
+    fig = go.Figure(chart(ids=hierarchy.index,
+                          labels=hierarchy["Name"],
+                          parents=hierarchy["Parent"],
+                          values=own_values,
+                          branchvalues="remainder",
+                          maxdepth=4))
+    
+    fig.update_layout(height=1000, margin=dict(t=0, l=0, r=0, b=0))
+    st.plotly_chart(fig, use_container_width=True)
+
 def metaphlanTaxonomy(dataframe, taxonomy_level):
-    """Function selects rows based on taxonomic level.
+    """Function aggregates rows to selected taxonomic level using the taxonomy tree index.
 
     Args:
         dataframe (DataFrame): Whole table (file)
         taxonomy_level (str): Selected taxonomic level
 
     Returns:
-        DataFrame: DataFrame with only rows on selected taxonomic level.
+        DataFrame: DataFrame with rows rolled up to selected taxonomic level.
     """
-    match taxonomy_level:
-        case "Taxonomic Level 1 (Kingdom)":
-            selection = dataframe[dataframe.index.str.contains("k__") & ~dataframe.index.str.contains("p__")]
-        case "Taxonomic Level 2 (Phylum)":
-            selection = dataframe[dataframe.index.str.contains("p__") & ~dataframe.index.str.contains("c__")]
-        case "Taxonomic Level 3 (Class)":
-            selection = dataframe[dataframe.index.str.contains("c__") & ~dataframe.index.str.contains("o__")]
-        case "Taxonomic Level 4 (Order)":
-            selection = dataframe[dataframe.index.str.contains("o__") & ~dataframe.index.str.contains("f__")]
-        case "Taxonomic Level 5 (Family)":
-            selection = dataframe[dataframe.index.str.contains("f__") & ~dataframe.index.str.contains("g__")]
-        case "Taxonomic Level 6 (Genus)":
-            selection = dataframe[dataframe.index.str.contains("g__") & ~dataframe.index.str.contains("s__")]
-        case "Taxonomic Level 7 (Species)":
-            selection = dataframe[dataframe.index.str.contains("s__") & ~dataframe.index.str.contains("t__")]
-        case "Taxonomic Level 8 (All)":
-            selection = dataframe
+    if taxonomy_level == "Taxonomic Level 8 (All)":
+        return dataframe
+
+    lineages, _ = taxonomy_tree(dataframe.index)
+    selection = rollup_taxonomy(dataframe, lineages, METAPHLAN_LEVELS[taxonomy_level])
     
     return selection
 
@@ -170,6 +200,271 @@ def pathabundaceTaxonomy(dataframe, taxonomy_level):
     return selection
 
 
+# Section for heatmap (clustergram)
+@st.fragment
+def heatmapSection(dataset, select_file):
+    """Shows clustergram of top rows. Interaction with its widgets reruns only this section.
+
+    Args:
+        dataset (DataFrame): Whole table (file)
+        select_file (str): Name of selected file
+    """
+    # Condition to exclude pathcoverage 
+    if "pathcoverage" not in select_file:
+        # Columns for buttons
+        top_menu = st.columns(4)
+        # Button to select number of top taxa
+        with top_menu[0]:
+            topN = st.selectbox("Select number of top taxa:",
+                            (10, 25, 50, "all"), help="Number of top taxa from ordered descending statistic (per row).")
+        # Button to select statistic to order rows by
+        with top_menu[2]:
+            statistic = st.selectbox("Select statistic to order taxa by:", options=SUMMARY_COLUMNS,
+                                     help="Precomputed statistic per row, top taxa have the highest values.")
+        # Button to select distance metric
+        with top_menu[1]:
+            metrics = st.selectbox("Select distance metric for clustering:", options=["Euclidean", "Correlation", "Jaccard"], 
+                                help="Distance metric for calculating the dendrograms and distance between features.")
+        
+        # Drop all unwanted rows in DataFrame
+        df = dataset[dataset.index.str.contains("g__|unclassified|UNINTEGRATED|UNMAPPED")==False]
+        # Drop rare and low abundant features before clustering
+        df, prefilter_report = prefilter_features(df, **st.session_state.prefilter)
+        show_prefilter_report(prefilter_report)
+        # Sort table by precomputed statistic
+        df = sort_by_row_statistic(df, row_summary(df), statistic)
+
+        # Take only given number of taxa
+        if topN == 10:
+            topTaxa = df.iloc[:10]
+        elif topN == 25:
+            topTaxa = df.iloc[:25]
+        elif topN == 50:
+            topTaxa = df.iloc[:50]
+        elif topN == "all":
+            topTaxa = df
+        
+        
+        # Button to select rendering, large tables are drawn as image by default
+        with top_menu[3]:
+            rendering = st.selectbox("Select rendering:", options=["Interactive", "Raster"], index=int(topTaxa.size > RASTER_MIN_CELLS),
+                                     help="Raster aggregates the table to the pixels of the image on the server, suitable for very large tables.")
+
+        if rendering == "Interactive":
+            # Cluster the data in the background, job is reused while parameters stay the same
+            job = run_in_background("clustergram", computeClustergram, topTaxa, metrics.lower())
+            fig = wait_for_job(job, "Clustering...")
+
+            if fig is not None:
+                # Plot the figure
+                st.plotly_chart(fig, use_container_width=True)
+
+                # Create legend for the heatmap (clustergram)
+                heatmapLegend(list(topTaxa.index))
+
+        else:
+            # Order and aggregate the data in the background
+            job = run_in_background("clustergram", build_tile_pyramid, topTaxa, metrics.lower())
+            pyramid = wait_for_job(job, "Preparing tiles...")
+
+            if pyramid is not None and len(pyramid["rows"]) > 0:
+                # Window of rows to show, smaller window is rendered in higher resolution
+                first, last = 1, len(pyramid["rows"])
+                if last > 1:
+                    first, last = st.slider("Rows shown:", min_value=1, max_value=last, value=(first, last),
+                                            help="Zoom to a range of rows, each image row shows mean of fewer table rows.")
+                fig = raster_figure(pyramid, first - 1, last)
+                st.plotly_chart(fig, use_container_width=True)
+
+                rows_per_pixel = (last - first + 1) / min(last - first + 1, RASTER_HEIGHT)
+                st.caption(f"Each image row shows mean of {rows_per_pixel:.1f} rows, color is log(1 + abundance). "
+                           "Rows and samples are ordered by clustering when there are at most a few thousand of them.")
+
+                # Create legend for the heatmap
+                heatmapLegend(list(pyramid["rows"]))
+    else:
+        st.markdown("## Please select different file.")
+
+
+# Section for barplots
+@st.fragment
+def barplotSection(dataset, select_file):
+    """Shows stacked barplots. Interaction with its widgets reruns only this section.
+
+    Args:
+        dataset (DataFrame): Whole table (file)
+        select_file (str): Name of selected file
+    """
+    if "metaphlan" in select_file:
+
+        # Select box for selecting taxonomy level
+        taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                      options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)"],
+                                      help="Show barplot for specific taxonomic level.")
+        
+        # Include only rows with selected taxonomic level
+        barplot_df = metaphlanTaxonomy(dataset, taxonomy_level)
+        
+        # Create and show barplot
+        createBarplot(barplot_df, "Relativní abundance [%]")
+
+
+    elif "pathabundance" in select_file:
+        # Select box for selecting taxonomy level
+        taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                      options=["Taxonomic Level 1"],
+                                      help="Show barplot for specific taxonomic level.")
+        
+        # Include only rows with selected taxonomic level
+        barplot_df = pathabundaceTaxonomy(dataset, taxonomy_level)
+
+        # Normalize selected dataset
+        normalized_dataset = run_cached(normalize_dataset, barplot_df)
+
+        # Create and show barplot
+        createBarplot(normalized_dataset, "Relativní abundance [%]")
+    
+    elif "genefamilies" in select_file:
+        
+        # Columns for buttons
+        barplot_menu = st.columns(3)
+
+        with barplot_menu[0]:
+
+            # Select box for selecting taxonomy level
+            taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                        options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"],
+                                        help="Show barplot for specific taxonomic level.")
+        with barplot_menu[1]:
+            # Select columns to plot
+            select_column = st.selectbox("Select column:", options=dataset.columns, help="Select column from genefamilies table (cannot show all columns at once due to extremely large table).")
+        
+        with barplot_menu[2]:
+            # Select number of top taxa in the column
+            n_rows = st.selectbox("Select number of top rows:", options=[10, 25, 50, 100], help="Select number of top rows form selected column order descending.")
+        
+        # Include only rows with selected taxonomic level
+        barplot_df = genefamiliesTaxonomy(dataset, taxonomy_level)
+
+        # Take only selected column            
+        barplot_df = barplot_df.loc[:, [select_column]]
+        # Sort descending by selected column
+        barplot_df = barplot_df.sort_values(by= select_column,ascending=False)
+        # Take only selected number of top taxa
+        barplot_df = barplot_df.head(n_rows)
+        # Create and show barplot
+        createBarplot(barplot_df, "Absolutní abundance [RPKs]")
+    else:
+        # If pathcoverage file is selected, show this message
+        st.markdown("## Please select different file.")
+
+
+# Section for stratified contributions
+@st.fragment
+def contributionsSection(full_dataset, dataset, select_file):
+    """Shows contributions of taxa to a gene family or pathway, or features a taxon contributes to.
+    Interaction with its widgets reruns only this section.
+
+    Args:
+        full_dataset (DataFrame): Whole table (file) with all samples
+        dataset (DataFrame): Whole table with samples kept by the sample filter
+        select_file (str): Name of selected file
+    """
+    # Only HUMAnN tables have rows stratified by taxa
+    if "genefamilies" in select_file or "pathabundance" in select_file:
+        # Parse stratified rows once per table into contribution index, selected samples are its columns
+        index = contribution_index(full_dataset)
+
+        if len(index["features"]):
+            # Columns for buttons
+            contribution_menu = st.columns(4)
+
+            with contribution_menu[0]:
+                # Select whether to look up feature or taxon
+                query_by = st.selectbox("Query by:", options=["Feature", "Taxon"], help="Taxa contributing to a feature, or features a taxon contributes to.")
+            names = index["features"] if query_by == "Feature" else index["taxa"]
+
+            with contribution_menu[1]:
+                # Search in names with the n-gram index
+                query = st.text_input("Search:", key="contribution_search", help="Shows only names which contain the text.")
+            if query:
+                names = names[search_rows(search_index(names), query)]
+
+            with contribution_menu[2]:
+                # Select feature or taxon, long lists are shortened
+                selected = st.selectbox(f"Select {query_by.lower()}:", options=names[:1000],
+                                        help=f"{len(names)} matching names, first 1000 are offered.")
+
+            with contribution_menu[3]:
+                # Select number of largest rows, the rest is summed
+                n_rows = st.selectbox("Select number of top rows:", options=[10, 25, 50], key="contribution_rows",
+                                      help="Rows with the highest total abundance, remaining rows are summed as Other.")
+
+            # Select columns to plot, all columns when empty
+            samples = st.multiselect("Select columns:", options=dataset.columns, key="contribution_samples", help="All columns are shown when nothing is selected.")
+
+            if selected is not None:
+                if query_by == "Feature":
+                    contributions = feature_contributions(index, selected, samples or list(dataset.columns))
+                else:
+                    contributions = taxon_features(index, selected, samples or list(dataset.columns))
+
+                # Create and show barplot
+                y_title = "Absolutní abundance [RPKs]" if "genefamilies" in select_file else "Absolutní abundance"
+                createBarplot(top_contributors(contributions, n_rows), y_title)
+        else:
+            st.markdown("## Selected file has no rows stratified by taxa.")
+    else:
+        # If other file is selected, show this message
+        st.markdown("## Please select genefamilies or pathabundance file.")
+
+
+# Section for taxonomy tree
+@st.fragment
+def taxonomySection(dataset, select_file):
+    """Shows sunburst/treemap of taxonomy tree. Interaction with its widgets reruns only this section.
+
+    Args:
+        dataset (DataFrame): Whole table (file)
+        select_file (str): Name of selected file
+    """
+    # Condition to exclude pathcoverage (coverage can not be summed)
+    if "pathcoverage" not in select_file:
+        # Parse lineages once into tree index
+        lineages, nodes = taxonomy_tree(dataset.index)
+        ranks = list(lineages.columns[:-2])
+
+        if ranks:
+            # Columns for buttons
+            taxonomy_menu = st.columns(3)
+
+            with taxonomy_menu[0]:
+                # Select type of the chart
+                chart_type = st.selectbox("Select chart:", options=["Sunburst", "Treemap"], help="Sunburst or treemap of the taxonomy tree.")
+
+            with taxonomy_menu[1]:
+                # Select column or mean of all columns
+                taxonomy_sample = st.selectbox("Select column:", options=["Mean of all samples"] + list(dataset.columns),
+                                               key="taxonomy_sample", help="Abundances of the selected sample or mean abundance of all samples.")
+
+            with taxonomy_menu[2]:
+                # Select deepest rank of the tree
+                max_rank = st.selectbox("Select deepest taxonomic level:", options=ranks, index=len(ranks) - 1,
+                                        format_func=lambda rank: RANK_NAMES[rank], help="Deepest taxonomic level shown in the chart.")
+
+            # Roll abundances up to every rank of the tree
+            hierarchy = taxonomy_hierarchy(dataset, lineages, nodes, max_rank,
+                                           sample=None if taxonomy_sample == "Mean of all samples" else taxonomy_sample)
+
+            # Create and show chart
+            createTaxonomyChart(hierarchy, chart_type)
+        else:
+            st.markdown("## Selected file does not contain taxonomy.")
+    else:
+        # If pathcoverage file is selected, show this message
+        st.markdown("## Please select different file.")
+
+
 # Initialize the session state dictionary if not already present
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = {}
@@ -192,135 +487,39 @@ if st.session_state.uploaded_files:
 
 
     file = st.session_state.uploaded_files[select_file]
-    dataset = load_data(file, select_file)
-
-    st.title("Graphs")
+    full_dataset = load_data(file, select_file)
 
-    # Create tabs for heatmap and barplots 
-    tab1, tab2 = st.tabs(["Heatmap", "Barplots"])
+    # Gene families are summed into groups of the selected mapping file before any analysis
+    mapping_content = regroup_sidebar(select_file)
+    if mapping_content is not None:
+        full_dataset = regroup_table(full_dataset, mapping_content)
 
-    #################################### Heatmap ####################################
-    with tab1:
-        # Condition to exclude pathcoverage 
-        if "pathcoverage" not in select_file:
-            # Columns for buttons
-            top_menu = st.columns(2)
-            # Button to select number of top taxa
-            with top_menu[0]:
-                topN = st.selectbox("Select number of top taxa:",
-                                (10, 25, 50, "all"), help="Number of top taxa from ordered descending mean abundance (per row) column.")
-            # Button to select distance metric
-            with top_menu[1]:
-                metrics = st.selectbox("Select distance metric for clustering:", options=["Euclidean", "Correlation", "Jaccard"], 
-                                    help="Distance metric for calculating the dendrograms and distance between features.")
-            
-            # Drop all unwanted rows in DataFrame
-            df = dataset[dataset.index.str.contains("g__|unclassified|UNINTEGRATED|UNMAPPED")==False]
-            # Sort table by mean abundance 
-            df = sort_by_mean_abundance(df)
-
-            # Take only given number of taxa
-            if topN == 10:
-                topTaxa = df.iloc[:10]
-            elif topN == 25:
-                topTaxa = df.iloc[:25]
-            elif topN == 50:
-                topTaxa = df.iloc[:50]
-            elif topN == "all":
-                topTaxa = df
-            
-            
-            # Create figure for the heatmap (clustergram)
-            fig = dash_bio.Clustergram(
-                data=topTaxa,
-                row_labels=list(range(1, len(topTaxa.index)+1)),
-                column_labels=list(topTaxa.columns),
-                height=1200,
-                color_map="sunset",
-                row_dist=metrics.lower(),
-                col_dist=metrics.lower()
-
-            )
-            
-            # Plot the figure
-            st.plotly_chart(fig, use_container_width=True)
-
-            # Create legend for the heatmap (clustergram)
-            st.write("### Legend:")
-            index_names = topTaxa.index
-            ordered_list = "\n".join([f"{i+1}. {name}" for i, name in enumerate(index_names)])
-            st.markdown(ordered_list)
-        else:
-            st.markdown("## Please select different file.")
-    
-    #################################### Barplots ####################################
-    with tab2:
-        
-        if "metaphlan" in select_file:
+    # Samples are selected once, all sections show only the selected columns
+    dataset = select_samples(full_dataset, st.session_state.get("metadata"), sample_filter_sidebar())
+    show_sample_report(full_dataset, dataset)
 
-            # Select box for selecting taxonomy level
-            taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                          options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)"],
-                                          help="Show barplot for specific taxonomic level.")
-            
-            # Include only rows with selected taxonomic level
-            barplot_df = metaphlanTaxonomy(dataset, taxonomy_level)
-            
-            # Create and show barplot
-            createBarplot(barplot_df, "Relativní abundance [%]")
+    # Pre-filter settings shared with Statistics
+    prefilter_sidebar()
 
+    # Export and restore of computed results
+    snapshot_sidebar()
 
-        elif "pathabundance" in select_file:
-            # Select box for selecting taxonomy level
-            taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                          options=["Taxonomic Level 1"],
-                                          help="Show barplot for specific taxonomic level.")
-            
-            # Include only rows with selected taxonomic level
-            barplot_df = pathabundaceTaxonomy(dataset, taxonomy_level)
+    st.title("Graphs")
 
-            # Normalize selected dataset
-            normalized_dataset = normalize_dataset(barplot_df)
+    # Select graph, only the selected section is executed
+    graph = st.radio("Graph:", options=["Heatmap", "Barplots", "Contributions", "Taxonomy"], horizontal=True,
+                     key="graphs_tab", label_visibility="collapsed")
 
-            # Create and show barplot
-            createBarplot(normalized_dataset, "Relativní abundance [%]")
-        
-        elif "genefamilies" in select_file:
-            
-            # Columns for buttons
-            barplot_menu = st.columns(3)
-
-            with barplot_menu[0]:
-
-                # Select box for selecting taxonomy level
-                taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                            options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"],
-                                            help="Show barplot for specific taxonomic level.")
-            with barplot_menu[1]:
-                # Select columns to plot
-                select_column = st.selectbox("Select column:", options=dataset.columns, help="Select column from genefamilies table (cannot show all columns at once due to extremely large table).")
-            
-            with barplot_menu[2]:
-                # Select number of top taxa in the column
-                n_rows = st.selectbox("Select number of top rows:", options=[10, 25, 50, 100], help="Select number of top rows form selected column order descending.")
-            
-            # Include only rows with selected taxonomic level
-            barplot_df = genefamiliesTaxonomy(dataset, taxonomy_level)
-
-            # Take only selected column            
-            barplot_df = barplot_df.loc[:, [select_column]]
-            # Sort descending by selected column
-            barplot_df = barplot_df.sort_values(by= select_column,ascending=False)
-            # Take only selected number of top taxa
-            barplot_df = barplot_df.head(n_rows)
-            # Create and show barplot
-            createBarplot(barplot_df, "Absolutní abundance [RPKs]")
-        else:
-            # If pathcoverage file is selected, show this message
-            st.markdown("## Please select different file.")
+    match graph:
+        case "Heatmap":
+            heatmapSection(dataset, select_file)
+        case "Barplots":
+            barplotSection(dataset, select_file)
+        case "Contributions":
+            contributionsSection(full_dataset, dataset, select_file)
+        case "Taxonomy":
+            taxonomySection(dataset, select_file)
 
-            
-        
 else:
     # If no file is loaded display this title
     st.title("Please upload data in the sidebar")
\ No newline at end of file
@@ -1,6 +1,7 @@
 # Import libraries 
 import streamlit as st
 import pandas as pd
+import numpy as np
 
 from io import BytesIO
 
@@ -10,6 +11,18 @@ import plotly.express as px
 from skbio.diversity.alpha import shannon, simpson
 from skbio.diversity import beta_diversity
 from skbio.stats.ordination import pcoa
+from skbio import DistanceMatrix
+
+from utils.filtering import prefilter_features, prefilter_sidebar, show_prefilter_report
+from utils.jobs import run_cached, run_in_background, run_interruptible, wait_for_job
+from utils.network import NETWORK_METHODS, correlation_edges, network_layout
+from utils.ordination import nmds
+from utils.regroup import regroup_sidebar, regroup_table
+from utils.samples import per_sample, sample_filter_sidebar, sample_name, select_samples, show_sample_report, subset_distances
+from utils.sketch import SKETCH_HEATMAP_SAMPLES, sample_sketches, sketch_distances, sketch_standard_error
+from utils.snapshot import snapshot_sidebar
+from utils.stats import permutation_test
+from utils.taxonomy import METAPHLAN_LEVELS, rollup_taxonomy, taxonomy_tree
 
 
 
@@ -18,6 +31,7 @@ st.set_page_config(layout="wide")
 
 
 # Function for loading data from .tsv file
+@st.cache_data(show_spinner=False)
 def load_data(file, file_name):
     """Converts loaded file from bytes format to  Pandas DataFrame. 
 
@@ -46,7 +60,7 @@ def plotDifferentialHeatmap(selected_dataset, nTopRows):
     """
 
     # Calculate Difference column
-    selected_dataset["Difference"] = abs(selected_dataset[str(first_sample)] - selected_dataset[str(second_sample)])
+    selected_dataset["Difference"] = abs(selected_dataset.iloc[:, 0] - selected_dataset.iloc[:, 1])
 
     # Sort descending by Difference column
     selected_dataset = selected_dataset.sort_values(by="Difference", ascending=False)
@@ -70,33 +84,151 @@ def plotDifferentialHeatmap(selected_dataset, nTopRows):
     # Display heatmap
     st.plotly_chart(fig, use_container_width=True)
 
+# Function to calculate alpha diversity
+def computeAlphaDiversity(alpha_dataset, measure):
+    """Calculates alpha diversity index of every sample (column).
+
+    Args:
+        alpha_dataset (DataFrame): Table with taxa in rows and samples in columns
+        measure (str): "Shannon" or "Simpson"
+
+    Returns:
+        Series: Diversity index per sample name (part of column name before "_")
+    """
+    # Index of a sample does not depend on other samples, values of other subsets are reused
+    diversity_indexes = per_sample(shannon if measure == "Shannon" else simpson, alpha_dataset)
+    diversity_indexes.index = [sample_name(column) for column in alpha_dataset.columns]
+    return diversity_indexes
+
+# Function to test differences between groups of samples, runs in the background
+def computeGroupTest(job, distance_df, grouping, method, permutations):
+    """Runs PERMANOVA or ANOSIM on the distance matrix.
+
+    Args:
+        job (Job): Background job used to report progress
+        distance_df (DataFrame): Distance matrix of samples
+        grouping (Series): Metadata value of every sample
+        method (str): "PERMANOVA" or "ANOSIM"
+        permutations (int): Number of permutations
+
+    Returns:
+        dict: Result of the test
+    """
+    return permutation_test(distance_df, grouping, method, permutations, job=job)
+
+# Function to calculate NMDS ordination, runs in the background
+def computeNMDS(job, distance_df, dimensions, seed, n_starts):
+    """Calculates NMDS of the distance matrix from several random starts.
+
+    Args:
+        job (Job): Background job used to report progress
+        distance_df (DataFrame): Distance matrix of samples
+        dimensions (int): Number of dimensions of the ordination
+        seed (int): Seed of random starts
+        n_starts (int): Number of random starts
+
+    Returns:
+        tuple: Coordinates of samples and dictionary with stress and convergence
+    """
+    return nmds(distance_df, dimensions, n_starts, seed, job=job)
+
+# Function to calculate co-occurrence network, runs in the background
+def computeNetwork(job, network_dataset, method, threshold, max_edges):
+    """Calculates strongest associations of features and layout of the network.
+
+    Args:
+        job (Job): Background job used to report progress
+        network_dataset (DataFrame): Table with features in rows and samples in columns
+        method (str): Correlation or proportionality measure
+        threshold (float): Minimal absolute association of an edge
+        max_edges (int): Number of strongest edges to keep
+
+    Returns:
+        tuple: Edges DataFrame and DataFrame with positions of nodes
+    """
+    edges = correlation_edges(network_dataset, method, threshold, max_edges, job=job)
+    job.report(0.8, f"Placing {len(edges)} edges...")
+    return edges, network_layout(edges)
+
+# Function to create figure of co-occurrence network
+def plotNetwork(edges, layout):
+    """Function that creates network figure, positive associations are blue and negative red.
+
+    Args:
+        edges (DataFrame): Edges with columns Source, Target and Weight
+        layout (DataFrame): Positions and degree of nodes
+
+    Returns:
+        Figure: Network figure
+    """
+    fig = go.Figure()
+
+    # Edges are drawn as one line trace per sign, separated by None
+    for name, color, selected in [("Positive", "rgba(31, 119, 180, 0.5)", edges["Weight"] > 0), ("Negative", "rgba(214, 39, 40, 0.5)", edges["Weight"] < 0)]:
+        source = layout.loc[edges["Source"][selected]]
+        target = layout.loc[edges["Target"][selected]]
+        x = np.column_stack([source["x"], target["x"], np.full(len(source), np.nan)]).ravel()
+        y = np.column_stack([source["y"], target["y"], np.full(len(source), np.nan)]).ravel()
+        fig.add_trace(go.Scatter(x=x, y=y, mode="lines", line=dict(color=color, width=1), name=name, hoverinfo="skip"))
+
+    fig.add_trace(go.Scatter(x=layout["x"], y=layout["y"], mode="markers", name="Features",
+                             marker=dict(size=6 + 2 * np.sqrt(layout["Degree"]), color=layout["Degree"], colorscale="Sunset", showscale=True, colorbar=dict(title="Degree")),
+                             text=layout.index, hovertemplate="%{text}<br>Degree: %{marker.color}<extra></extra>"))
+
+    fig.update_layout(height=800, showlegend=True,
+                      xaxis=dict(visible=False), yaxis=dict(visible=False, scaleanchor="x"),
+                      margin=dict(l=20, r=20, t=20, b=20))
+    return fig
+
+# Function to calculate beta diversity, runs in the background
+def computeBetaDiversity(job, beta_dataset, metric, sketch_size=None):
+    """Calculates distance matrix between samples and its PCoA. With sketch_size the
+    distances are estimated from (weighted) MinHash sketches of the samples and PCoA
+    computes only the three plotted axes by randomized SVD.
+
+    Args:
+        job (Job): Background job used to report progress
+        beta_dataset (DataFrame): Transposed table (samples in rows)
+        metric (str): Beta diversity metric ("braycurtis" or "jaccard")
+        sketch_size (int, optional): Number of hash functions of approximate computation
+
+    Returns:
+        tuple: DistanceMatrix and OrdinationResults of PCoA
+    """
+    if sketch_size:
+        job.report(0.0, f"Sketching {len(beta_dataset)} samples...")
+        sketches = sample_sketches(beta_dataset.T, sketch_size, weighted=metric == "braycurtis", job=job)
+        distance_df = sketch_distances(sketches, metric)
+        distance_matrix = DistanceMatrix(distance_df.to_numpy(), ids=[str(sample) for sample in distance_df.index])
+    else:
+        job.report(0.0, f"Calculating distances between {len(beta_dataset)} samples...")
+        # Distances of a subset of samples are sliced from distances of the whole table when available
+        distances = subset_distances(beta_dataset, metric, lambda: run_interruptible(job, beta_dataset.size, beta_diversity, metric=metric, counts=beta_dataset))
+        distance_matrix = DistanceMatrix(distances, ids=[str(sample) for sample in beta_dataset.index])
+
+    job.report(0.7, "Calculating PCoA...")
+    if sketch_size:
+        # Only three axes are plotted, randomized SVD avoids full eigendecomposition for large cohorts
+        pcoa_results = run_interruptible(job, distance_matrix.data.size, pcoa, distance_matrix, method="fsvd", dimensions=3)
+    else:
+        pcoa_results = run_interruptible(job, distance_matrix.data.size, pcoa, distance_matrix)
+    return distance_matrix, pcoa_results
+
 def metaphlanTaxonomy(dataframe, taxonomy_level):
-    """Function selects rows based on taxonomic level.
+    """Function aggregates rows to selected taxonomic level using the taxonomy tree index.
 
     Args:
         dataframe (DataFrame): Whole table (file)
         taxonomy_level (str): Selected taxonomic level
 
     Returns:
-        DataFrame: DataFrame with only rows on selected taxonomic level.
+        DataFrame: DataFrame with rows rolled up to selected taxonomic level.
     """
-    match taxonomy_level:
-        case "Taxonomic Level 1 (Kingdom)":
-            selection = dataframe[dataframe.index.str.contains("k__") & ~dataframe.index.str.contains("p__")]
-        case "Taxonomic Level 2 (Phylum)":
-            selection = dataframe[dataframe.index.str.contains("p__") & ~dataframe.index.str.contains("c__")]
-        case "Taxonomic Level 3 (Class)":
-            selection = dataframe[dataframe.index.str.contains("c__") & ~dataframe.index.str.contains("o__")]
-        case "Taxonomic Level 4 (Order)":
-            selection = dataframe[dataframe.index.str.contains("o__") & ~dataframe.index.str.contains("f__")]
-        case "Taxonomic Level 5 (Family)":
-            selection = dataframe[dataframe.index.str.contains("f__") & ~dataframe.index.str.contains("g__")]
-        case "Taxonomic Level 6 (Genus)":
-            selection = dataframe[dataframe.index.str.contains("g__") & ~dataframe.index.str.contains("s__")]
-        case "Taxonomic Level 7 (Species)":
-            selection = dataframe[dataframe.index.str.contains("s__") & ~dataframe.index.str.contains("t__")]
-        case "Taxonomic Level 8 (All)":
-            selection = dataframe
+    if taxonomy_level == "Taxonomic Level 8 (All)":
+        return dataframe
+
+    lineages, _ = taxonomy_tree(dataframe.index)
+    selection = rollup_taxonomy(dataframe, lineages, METAPHLAN_LEVELS[taxonomy_level])
     
     return selection
 
@@ -134,244 +266,238 @@ def pathabundaceTaxonomy(dataframe, taxonomy_level):
     return selection
 
 
-# Initialize the session state dictionary if not already present
-if "uploaded_files" not in st.session_state:
-    st.session_state.uploaded_files = {}
-
-# Widget to upload single file
-uploaded_files = st.sidebar.file_uploader("Select TSV file to upload", accept_multiple_files=True, type=["tsv", "csv"])
-
-# Upload multiple files and save the to dictionary
-if uploaded_files:
-    for uploaded_file in uploaded_files:
-        if uploaded_file.name not in st.session_state.uploaded_files:
-            st.session_state.uploaded_files[uploaded_file.name] = uploaded_file.getvalue()
-    
-    
-# Files are uploaded and one file is selected
-if st.session_state.uploaded_files:
-    file_names = list(st.session_state.uploaded_files.keys())
-
-    with st.sidebar:
-        select_file = st.selectbox("Select file:", options=file_names)
-
-    file = st.session_state.uploaded_files[select_file]
-    dataset = load_data(file, select_file)
-
-    # Define session state variables for each statistical analysis
-    if "metadata" not in st.session_state:
-        st.session_state.metadata = None
-    
-    if "metadata_uploaded" not in st.session_state:
-        st.session_state.metadata_uploaded = False
+# Section for alpha diversity analysis
+@st.fragment
+def alphaDiversitySection(dataset, select_file):
+    """Shows alpha diversity analysis. Interaction with its widgets reruns only this section.
 
-    # Print title of the page
-    st.title("Statistics")
-
-    # Create tabs for each statistical analysis
-    alpha_tab, beta_tab, differential_tab = st.tabs(["Alpha Diversity", "Beta Diversity", "Differential Expression"])
-
-    ################################### Alpha diversity ###################################
-    # Tab for alpha diversity analysis
-    with alpha_tab:
-        # Condition to upload metadata if no metadata uploaded
-        if st.session_state.metadata_uploaded == False:
-            st.markdown("### Alpha and beta analysis requires metadata file. Please upload it below:")
-            metadata_file = st.file_uploader("Upload metadata:")
+    Args:
+        dataset (DataFrame): Whole table (file)
+        select_file (str): Name of selected file
+    """
+    # Condition to upload metadata if no metadata uploaded
+    if st.session_state.metadata_uploaded == False:
+        st.markdown("### Alpha and beta analysis requires metadata file. Please upload it below:")
+        metadata_file = st.file_uploader("Upload metadata:")
+
+        # Condition to process loaded metadata
+        if metadata_file:
+            bytes_metadata = metadata_file.getvalue()
+            
+            if ".tsv" in metadata_file.name:
+                metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep="\t", index_col=0)
+            if ".csv" in metadata_file.name:
+                metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep=",", index_col=0)
+            
+            st.session_state.metadata = metadata_df
+            st.session_state.metadata_uploaded = True
+            st.rerun()
 
-            # Condition to process loaded metadata
-            if metadata_file:
-                bytes_metadata = metadata_file.getvalue()
+    # After metadata uploaded, create plots for statistical analysis        
+    elif st.session_state.metadata_uploaded == True:
+        
+        st.markdown("## Alpha diversity")
+        
+        if "pathcoverage" not in select_file:
+            alpha_menu = st.columns(3)
+
+            with alpha_menu[0]:
+                if "metaphlan" in select_file:
+
+                    # Select box for selecting taxonomic level
+                    alpha_taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                                options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)", "Taxonomic Level 8 (All)"],
+                                                help="Show alpha diversity for specific taxonomic level.")
+                    # Include only rows with selected taxonomic level
+                    alpha_dataset = metaphlanTaxonomy(dataset, alpha_taxonomy_level)
+
+                elif "pathabundance" in select_file:
+                    # Select box for selecting taxonomic level
+                    alpha_taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                                options=["Taxonomic Level 1"],help="Show alpha diversity for specific taxonomic level.")
+                    # Include only rows with selected taxonomic level
+                    alpha_dataset = pathabundaceTaxonomy(dataset, alpha_taxonomy_level)
+
+                elif "genefamilies" in select_file:
+                
+                    # Select box for selecting taxonomic level
+                    alpha_taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                                    options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"], help="Show alpha diversity for specific taxonomic level.")
+                    # Include only rows with selected taxonomic level
+                    alpha_dataset = genefamiliesTaxonomy(dataset, alpha_taxonomy_level)
                 
-                if ".tsv" in metadata_file.name:
-                    metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep="\t", index_col=0)
-                if ".csv" in metadata_file.name:
-                    metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep=",", index_col=0)
                 
-                st.session_state.metadata = metadata_df
-                st.session_state.metadata_uploaded = True
-                st.rerun()
-
-        # After metadata uploaded, create plots for statistical analysis        
-        elif st.session_state.metadata_uploaded == True:
-            
-            st.markdown("## Alpha diversity")
-            
-            if "pathcoverage" not in select_file:
-                alpha_menu = st.columns(3)
-
-                with alpha_menu[0]:
-                    if "metaphlan" in select_file:
-
-                        # Select box for selecting taxonomic level
-                        alpha_taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                                    options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)", "Taxonomic Level 8 (All)"],
-                                                    help="Show alpha diversity for specific taxonomic level.")
-                        # Include only rows with selected taxonomic level
-                        alpha_dataset = metaphlanTaxonomy(dataset, alpha_taxonomy_level)
-
-                    elif "pathabundance" in select_file:
-                        # Select box for selecting taxonomic level
-                        alpha_taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                                    options=["Taxonomic Level 1"],help="Show alpha diversity for specific taxonomic level.")
-                        # Include only rows with selected taxonomic level
-                        alpha_dataset = pathabundaceTaxonomy(dataset, alpha_taxonomy_level)
-
-                    elif "genefamilies" in select_file:
-                    
-                        # Select box for selecting taxonomic level
-                        alpha_taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                                        options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"], help="Show alpha diversity for specific taxonomic level.")
-                        # Include only rows with selected taxonomic level
-                        alpha_dataset = genefamiliesTaxonomy(dataset, alpha_taxonomy_level)
-                    
                     
-                        
-                        
-                with alpha_menu[1]:
-                    # Select feature to group samples by
-                    feature_selection = st.selectbox("Select feature to group by:", options=st.session_state.metadata.columns, help="Features from metadata to group by.")
                     
-                with alpha_menu[2]:
-                    # Select alpha diversity measure 
-                    measure = st.selectbox("Select measure to calculate alpha diversity:", options=["Shannon", "Simpson"], help="Select preferred alpha diversity measure.")
+            with alpha_menu[1]:
+                # Select feature to group samples by
+                feature_selection = st.selectbox("Select feature to group by:", options=st.session_state.metadata.columns, help="Features from metadata to group by.")
+                
+            with alpha_menu[2]:
+                # Select alpha diversity measure 
+                measure = st.selectbox("Select measure to calculate alpha diversity:", options=["Shannon", "Simpson"], help="Select preferred alpha diversity measure.")
 
 
-                diversity_indexes = {}
-                if measure == "Shannon":
-                    # Calculate shannon index for all samples
-                    for column in alpha_dataset:
-                        diversity_indexes[column.split("_")[0]] = shannon(alpha_dataset[column])
-                
-                elif measure == "Simpson":
-                    # Calculate simpson index for all samples
-                    for column in alpha_dataset:
-                        diversity_indexes[column.split("_")[0]] = simpson(alpha_dataset[column])
+            # Calculate alpha diversity index for all samples, result is kept for snapshots
+            diversity_indexes = run_cached(computeAlphaDiversity, alpha_dataset, measure)
 
 
-                # Select feature for sample splitting 
-                unique_values = st.session_state.metadata[[feature_selection]]
+            # Select feature for sample splitting 
+            unique_values = st.session_state.metadata[[feature_selection]]
 
-                # Add alpha diversity indexes to selected feature dataframe
-                unique_values["DiversityIndex"] = unique_values.index.map(diversity_indexes)
-                
-                # Create violin plot for alpha diversity 
-                fig = go.Figure()
-
-                for seqKit in unique_values[feature_selection].unique():
-                    fig.add_trace(go.Violin(x=unique_values[feature_selection][unique_values[feature_selection] == seqKit],
-                                            y=unique_values["DiversityIndex"][unique_values[feature_selection] == seqKit],
-                                            name=seqKit,
-                                            box_visible=True,
-                                            meanline_visible=True,
-                                            points="all"))
-                
-                # Show violin plot
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.markdown("## Please select different file.")
+            # Add alpha diversity indexes to selected feature dataframe
+            unique_values["DiversityIndex"] = unique_values.index.map(diversity_indexes)
 
+            # Samples excluded by the sample filter have no index
+            unique_values = unique_values.dropna(subset=["DiversityIndex"])
+            
+            # Create violin plot for alpha diversity 
+            fig = go.Figure()
+
+            for seqKit in unique_values[feature_selection].unique():
+                fig.add_trace(go.Violin(x=unique_values[feature_selection][unique_values[feature_selection] == seqKit],
+                                        y=unique_values["DiversityIndex"][unique_values[feature_selection] == seqKit],
+                                        name=seqKit,
+                                        box_visible=True,
+                                        meanline_visible=True,
+                                        points="all"))
+            
+            # Show violin plot
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.markdown("## Please select different file.")
 
 
-    ################################### Beta diversity ###################################
-    # Tab for beta diversity analysis
-    with beta_tab:
-        # Condition to upload metadata if no metadata uploaded
-        if st.session_state.metadata_uploaded == False:
-            st.markdown("### Alpha and beta analysis requires metadata file. Please upload it below:")
-            metadata_file = st.file_uploader("Upload metadata:", key="Beta")
+# Section for beta diversity analysis
+@st.fragment
+def betaDiversitySection(dataset, select_file):
+    """Shows beta diversity analysis. Interaction with its widgets reruns only this section.
 
-            # Condition to process loaded metadata
-            if metadata_file:
-                bytes_metadata = metadata_file.getvalue()
+    Args:
+        dataset (DataFrame): Whole table (file)
+        select_file (str): Name of selected file
+    """
+    # Condition to upload metadata if no metadata uploaded
+    if st.session_state.metadata_uploaded == False:
+        st.markdown("### Alpha and beta analysis requires metadata file. Please upload it below:")
+        metadata_file = st.file_uploader("Upload metadata:", key="Beta")
+
+        # Condition to process loaded metadata
+        if metadata_file:
+            bytes_metadata = metadata_file.getvalue()
+            
+            if ".tsv" in metadata_file.name:
+                metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep="\t", index_col=0)
+            if ".csv" in metadata_file.name:
+                metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep=",", index_col=0)
+            
+            st.session_state.metadata = metadata_df
+            st.session_state.metadata_uploaded = True
+            st.rerun()
+            
+    elif st.session_state.metadata_uploaded == True:
+        
+        st.markdown("## Beta diversity")
+
+        # Condition to exclude pathcoverage 
+        if "pathcoverage" not in select_file:
+            beta_menu = st.columns(3)
+
+            with beta_menu[0]:
+                if "metaphlan" in select_file:
+
+                    # Select box for selecting taxonomy level
+                    beta_taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                                options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)", "Taxonomic Level 8 (All)"],
+                                                key="Beta", help="Show beta diversity for specific taxonomic level.")
+                    # Include only rows with selected taxonomic level
+                    beta_dataset = metaphlanTaxonomy(dataset, beta_taxonomy_level)
+
+                elif "pathabundance" in select_file:
+                    # Select box for selecting taxonomy level
+                    beta_taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                                options=["Taxonomic Level 1"],
+                                                key="Beta", help="Show beta diversity for specific taxonomic level.")
+                    # Include only rows with selected taxonomic level
+                    beta_dataset = pathabundaceTaxonomy(dataset, beta_taxonomy_level)
+
+                elif "genefamilies" in select_file:
                 
-                if ".tsv" in metadata_file.name:
-                    metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep="\t", index_col=0)
-                if ".csv" in metadata_file.name:
-                    metadata_df = pd.read_csv(BytesIO(bytes_metadata), sep=",", index_col=0)
+                    # Select box for selecting taxonomy level
+                    beta_taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                                    options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"],
+                                                    key="Beta", help="Show beta diversity for specific taxonomic level.")
+                    # Include only rows with selected taxonomic level
+                    beta_dataset = genefamiliesTaxonomy(dataset, beta_taxonomy_level)
                 
-                st.session_state.metadata = metadata_df
-                st.session_state.metadata_uploaded = True
-                st.rerun()
+                    
                 
-        elif st.session_state.metadata_uploaded == True:
+            with beta_menu[1]:
+                # Select exact or approximate computation
+                computation = st.selectbox("Select computation:", options=["Exact", "Approximate (sketches)"],
+                                           help="Approximate distances are estimated from MinHash (Jaccard) or weighted MinHash (Bray-Curtis) sketches of the samples, which is fast for very large cohorts.")
+                if computation == "Exact":
+                    sketch_size = None
+                else:
+                    sketch_size = st.selectbox("Select sketch size:", options=[64, 128, 256, 512, 1024], index=2,
+                                               help="Number of hash functions per sample, larger sketches are more precise.")
+
+            with beta_menu[2]:
+                # Select beta diversity measure 
+                measure = st.selectbox("Select measure to calculate beta diversity:", options=["Braycurtis", "Jaccard"], help="Select preferred beta diversity measure.")
+
+            # Drop rare and low abundant features before calculating distances
+            beta_dataset, prefilter_report = prefilter_features(beta_dataset, **st.session_state.prefilter)
+            show_prefilter_report(prefilter_report)
+
+            # Condition to exclude samples (columns) with zero in all rows
+            if any(beta_dataset[col].eq(0).all() for col in beta_dataset.columns):
+                all_zero_columns = beta_dataset.columns[(beta_dataset==0).all()]
+                beta_dataset = beta_dataset.drop(columns=all_zero_columns)
+
+                # Print the excluded samples
+                all_zero_list = ", ".join(list(all_zero_columns))
             
-            st.markdown("## Beta diversity")
-
-            # Condition to exclude pathcoverage 
-            if "pathcoverage" not in select_file:
-                beta_menu = st.columns(3)
-
-                with beta_menu[0]:
-                    if "metaphlan" in select_file:
+                st.markdown(f"<span style='color:red'>Column dropped due zero abundance values: {all_zero_list}.</span>", unsafe_allow_html=True)
 
-                        # Select box for selecting taxonomy level
-                        beta_taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                                    options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)", "Taxonomic Level 8 (All)"],
-                                                    key="Beta", help="Show beta diversity for specific taxonomic level.")
-                        # Include only rows with selected taxonomic level
-                        beta_dataset = metaphlanTaxonomy(dataset, beta_taxonomy_level)
-
-                    elif "pathabundance" in select_file:
-                        # Select box for selecting taxonomy level
-                        beta_taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                                    options=["Taxonomic Level 1"],
-                                                    key="Beta", help="Show beta diversity for specific taxonomic level.")
-                        # Include only rows with selected taxonomic level
-                        beta_dataset = pathabundaceTaxonomy(dataset, beta_taxonomy_level)
+            # Transpose DataFrame
+            beta_dataset = beta_dataset.T
+            
+            # Calculate beta diversity and PCoA in the background
+            if measure == "Braycurtis":
+                beta_job = run_in_background("beta", computeBetaDiversity, beta_dataset, "braycurtis", sketch_size)
+                title_heatmap = 'Heatmap of Bray-Curtis Distance Matrix (0 - max. similarity, 1 - max. dissimilarity)'
+                title_3D = '3D PCoA of Bray-Curtis Distance Matrix'
 
-                    elif "genefamilies" in select_file:
-                    
-                        # Select box for selecting taxonomy level
-                        beta_taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                                        options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"],
-                                                        key="Beta", help="Show beta diversity for specific taxonomic level.")
-                        # Include only rows with selected taxonomic level
-                        beta_dataset = genefamiliesTaxonomy(dataset, beta_taxonomy_level)
-                    
-                        
-                    
-                with beta_menu[2]:
-                    # Select beta diversity measure 
-                    measure = st.selectbox("Select measure to calculate beta diversity:", options=["Braycurtis", "Jaccard"], help="Select preferred beta diversity measure.")
+            elif measure == "Jaccard":
+                beta_job = run_in_background("beta", computeBetaDiversity, beta_dataset, "jaccard", sketch_size)
+                title_heatmap = 'Heatmap of Jaccard Distance Matrix (0 - max. dissimilarity, 1 - max. similarity)'
+                title_3D = '3D PCoA of Jaccard Distance Matrix'
 
-                # Condition to exclude samples (columns) with zero in all rows
-                if any(beta_dataset[col].eq(0).all() for col in beta_dataset.columns):
-                    all_zero_columns = beta_dataset.columns[(beta_dataset==0).all()]
-                    beta_dataset = beta_dataset.drop(columns=all_zero_columns)
+            beta_results = wait_for_job(beta_job, "Calculating beta diversity...")
 
-                    # Print the excluded samples
-                    all_zero_list = ", ".join(list(all_zero_columns))
-                
-                    st.markdown(f"<span style='color:red'>Column dropped due zero abundance values: {all_zero_list}.</span>", unsafe_allow_html=True)
+            if sketch_size:
+                st.caption(f"Distances are estimated from sketches of {sketch_size} hashes, standard error of estimated similarity is at most {sketch_standard_error(sketch_size):.3f}.")
 
-                # Transpose DataFrame
-                beta_dataset = beta_dataset.T
-                
-                # Calculate beta diversity 
-                if measure == "Braycurtis":
-                    distance_matrix = beta_diversity(metric="braycurtis", counts=beta_dataset)
-                    title_heatmap = 'Heatmap of Bray-Curtis Distance Matrix (0 - max. similarity, 1 - max. dissimilarity)'
-                    title_3D = '3D PCoA of Bray-Curtis Distance Matrix'
-
-                elif measure == "Jaccard":
-                    distance_matrix = beta_diversity(metric="jaccard", counts=beta_dataset)
-                    title_heatmap = 'Heatmap of Jaccard Distance Matrix (0 - max. dissimilarity, 1 - max. similarity)'
-                    title_3D = '3D PCoA of Jaccard Distance Matrix'
-
-                # Calculate PCOA
+            if beta_results is not None:
+                distance_matrix, pcoa_results = beta_results
                 distance_df = pd.DataFrame(distance_matrix.data, index=distance_matrix.ids, columns=distance_matrix.ids)
-                pcoa_results = pcoa(distance_matrix)
 
-                pcoa_df = pcoa_results.samples
-                pcoa_df.reset_index(inplace=True)
+                pcoa_df = pcoa_results.samples.reset_index()
                 pcoa_df.rename(columns={'index': 'Sample'}, inplace=True)
 
+                # Heatmap of all pairs of a large cohort is too large to draw, approximate computation shows regularly spaced samples
+                heatmap_df = distance_df
+                if sketch_size and len(distance_df) > SKETCH_HEATMAP_SAMPLES:
+                    shown = np.linspace(0, len(distance_df) - 1, SKETCH_HEATMAP_SAMPLES).round().astype(int)
+                    heatmap_df = distance_df.iloc[shown, shown]
+                    st.caption(f"Heatmap shows {SKETCH_HEATMAP_SAMPLES} regularly spaced of {len(distance_df)} samples.")
+
                 # Create heatmap for beta diversity 
                 beta_heatmap = go.Figure(data=go.Heatmap(
-                    z=distance_df.values,
-                    x=distance_df.columns,
-                    y=distance_df.index,
+                    z=heatmap_df.values,
+                    x=heatmap_df.columns,
+                    y=heatmap_df.index,
                     colorscale='Sunset'
                 ))
 
@@ -385,105 +511,320 @@ if st.session_state.uploaded_files:
                 # Show heatmap for beta diversity 
                 st.plotly_chart(beta_heatmap, use_container_width=True)  
 
-                # Create 3D scatter plot for PCoA
-                fig = px.scatter_3d(pcoa_df, x='PC1', y='PC2', z='PC3', text='Sample', title=title_3D,
-                    labels = {
-                            'PC1': f'PC1 ({pcoa_results.proportion_explained.iloc[0]*100:.2f}%)',
-                            'PC2': f'PC2 ({pcoa_results.proportion_explained.iloc[1]*100:.2f}%)',
-                            'PC3': f'PC3 ({pcoa_results.proportion_explained.iloc[2]*100:.2f}%)'
-                                }
-                                )
-                # Update the layout for better readability
-                fig.update_traces(marker=dict(size=5), selector=dict(mode='markers+text'))
-                fig.update_layout(autosize=False, width=800, height=600,
-                                margin=dict(l=50, r=50, b=50, t=50))
+                ordination_menu = st.columns(4)
+
+                with ordination_menu[0]:
+                    # Select ordination method
+                    ordination = st.selectbox("Select ordination:", options=["PCoA", "NMDS"],
+                                              help="PCoA preserves distances, NMDS preserves only their order which suits non-Euclidean distances like Bray-Curtis.")
+
+                if ordination == "PCoA":
+                    # Create 3D scatter plot for PCoA
+                    fig = px.scatter_3d(pcoa_df, x='PC1', y='PC2', z='PC3', text='Sample', title=title_3D,
+                        labels = {
+                                'PC1': f'PC1 ({pcoa_results.proportion_explained.iloc[0]*100:.2f}%)',
+                                'PC2': f'PC2 ({pcoa_results.proportion_explained.iloc[1]*100:.2f}%)',
+                                'PC3': f'PC3 ({pcoa_results.proportion_explained.iloc[2]*100:.2f}%)'
+                                    }
+                                    )
+                else:
+                    with ordination_menu[1]:
+                        dimensions = st.selectbox("Number of dimensions:", options=[2, 3], index=1)
+                    with ordination_menu[2]:
+                        n_starts = st.selectbox("Number of random starts:", options=[10, 20, 50], index=1,
+                                                help="Starts run in parallel, the solution with the lowest stress is kept.")
+                    with ordination_menu[3]:
+                        seed = st.number_input("Seed:", min_value=0, value=0, step=1, help="Seed of random starts, the same seed gives the same result.")
+
+                    # Optimise in the background, result is kept for the distance matrix, dimensions and seed
+                    nmds_job = run_in_background("nmds", computeNMDS, distance_df, dimensions, seed, n_starts)
+                    nmds_results = wait_for_job(nmds_job, "Calculating NMDS...")
+                    fig = None
+
+                    if nmds_results is not None:
+                        nmds_df, nmds_info = nmds_results
+                        nmds_df = nmds_df.rename_axis("Sample").reset_index()
+                        title_nmds = title_3D.replace("3D PCoA", f"{dimensions}D NMDS")
+
+                        if dimensions == 3:
+                            fig = px.scatter_3d(nmds_df, x="NMDS1", y="NMDS2", z="NMDS3", text="Sample", title=title_nmds)
+                        else:
+                            fig = px.scatter(nmds_df, x="NMDS1", y="NMDS2", text="Sample", title=title_nmds)
+
+                        st.caption(f"Stress {nmds_info['stress']:.4f} (best of {nmds_info['starts']} starts), "
+                                   f"{'converged' if nmds_info['converged'] else 'not converged'} after {nmds_info['iterations']} iterations, "
+                                   f"{nmds_info['converged starts']} of {nmds_info['starts']} starts converged.")
+
+                if fig is not None:
+                    # Update the layout for better readability
+                    fig.update_traces(marker=dict(size=5), selector=dict(mode='markers+text'))
+                    fig.update_layout(autosize=False, width=800, height=600,
+                                    margin=dict(l=50, r=50, b=50, t=50))
                 
-                # Show 3D scatter plot for PCoA
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                # If pathcoverage file is selected, show this message
-                st.markdown("## Please select different file.")
+                    # Show scatter plot of the ordination
+                    st.plotly_chart(fig, use_container_width=True)
 
+                st.markdown("### Group differences")
+                test_menu = st.columns(3)
 
-    ################################### Differential expression ###################################
-   # Tab for differential analysis 
-    with differential_tab:
+                with test_menu[0]:
+                    # Select feature to group samples by
+                    test_feature = st.selectbox("Select feature to test:", options=st.session_state.metadata.columns, key="beta_test_feature", help="Tests whether samples grouped by this feature differ in beta diversity.")
 
-        # Load currently selected dataset to session state variable 
-        st.session_state.differential_dataset = dataset
+                with test_menu[1]:
+                    test_method = st.selectbox("Select test:", options=["PERMANOVA", "ANOSIM"], help="PERMANOVA compares squared distances (pseudo-F), ANOSIM compares ranks of distances (R).")
 
-        # Columns for buttons
-        differential_menu = st.columns(3)
+                with test_menu[2]:
+                    permutations = st.selectbox("Number of permutations:", options=[999, 4999, 9999], help="More permutations give more precise p-value.")
 
-        with differential_menu[0]:
-            # Select first sample
-            first_sample = st.selectbox("Select first sample:", options=st.session_state.differential_dataset.columns, placeholder="-----", help="Select first sample to calculate difference.")
-        
-        with differential_menu[1]:
-            # Select second sample
-            second_sample = st.selectbox("Select second sample:", options=st.session_state.differential_dataset.columns, placeholder="-----", help="Select second sample to calculate difference.")
-        
-        with differential_menu[2]:
-            # Select number of top rows
-            n_top_rows = st.selectbox("Select number of top rows:", options=[10, 25, 50], help="Number of top rows from difference column ordered descending.")
+                # Map samples to metadata by sample name, the same as the sample filter
+                grouping = pd.Series([sample_name(sample) for sample in distance_df.index], index=distance_df.index).map(st.session_state.metadata[test_feature])
 
-        # If sample names are the same, show this message
-        if first_sample == second_sample:
-            st.markdown("## Please select two different columns")
+                test_job = run_in_background("beta_test", computeGroupTest, distance_df, grouping, test_method, permutations)
+                try:
+                    test_result = wait_for_job(test_job, "Running permutation test...")
+                except ValueError as error:
+                    st.warning(str(error))
+                    test_result = None
 
+                if test_result is not None:
+                    st.dataframe(pd.Series(test_result, name="Value").astype(str), use_container_width=True)
         else:
-            if "metaphlan" in select_file:
+            # If pathcoverage file is selected, show this message
+            st.markdown("## Please select different file.")
 
-                # Select box for selecting taxonomy level
-                taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                            options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)", "Taxonomic Level 8 (All)"],
-                                            key="diff", help="Select taxonomic level to calculate difference on.")
-                
-                # Include only rows with selected taxonomic level
-                differential_dataset = metaphlanTaxonomy(dataset,taxonomy_level)
 
-                # Include only selected columns
-                selected_dataset = differential_dataset[[str(first_sample), str(second_sample)]]
+# Section for co-occurrence network
+@st.fragment
+def networkSection(dataset, select_file):
+    """Shows network of features co-varying across samples. Interaction with its widgets reruns only this section.
 
-                # Create and show heatmap
-                plotDifferentialHeatmap(selected_dataset, n_top_rows)
+    Args:
+        dataset (DataFrame): Whole table (file)
+        select_file (str): Name of selected file
+    """
+    st.markdown("## Co-occurrence network")
 
-            elif "pathabundance" in select_file:
-                # Select box for selecting taxonomy level
-                taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                            options=["Taxonomic Level 1"],
-                                            key="diff", help="Select taxonomic level to calculate difference on.")
-                
-                # Include only rows with selected taxonomic level
-                differential_dataset = pathabundaceTaxonomy(dataset, taxonomy_level)
+    # Condition to exclude pathcoverage
+    if "pathcoverage" not in select_file:
+        network_menu = st.columns(4)
 
-                # Include only selected columns
-                selected_dataset = differential_dataset[[str(first_sample), str(second_sample)]]
+        with network_menu[0]:
+            if "metaphlan" in select_file:
+                # Select box for selecting taxonomy level
+                network_taxonomy_level = st.selectbox("Select taxonomic level:",
+                                                      options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)"],
+                                                      index=5, key="Network", help="Correlate taxa on specific taxonomic level.")
+                # Include only rows with selected taxonomic level
+                network_dataset = metaphlanTaxonomy(dataset, network_taxonomy_level)
 
-                # Create and show heatmap
-                plotDifferentialHeatmap(selected_dataset, n_top_rows)
+            elif "pathabundance" in select_file:
+                # Select box for selecting taxonomy level
+                network_taxonomy_level = st.selectbox("Select taxonomic level:", options=["Taxonomic Level 1"],
+                                                      key="Network", help="Correlate pathways on specific taxonomic level.")
+                # Include only rows with selected taxonomic level
+                network_dataset = pathabundaceTaxonomy(dataset, network_taxonomy_level)
 
             elif "genefamilies" in select_file:
-            
-                # Select box for selecting taxonomy level
-                taxonomy_level = st.selectbox("Select taxonomic level:", 
-                                                options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"],
-                                                key="diff", help="Select taxonomic level to calculate difference on.")
-                
-                # Include only rows with selected taxonomic level
-                differential_dataset = genefamiliesTaxonomy(dataset, taxonomy_level)
+                # Select box for selecting taxonomy level
+                network_taxonomy_level = st.selectbox("Select taxonomic level:", options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"],
+                                                      key="Network", help="Correlate gene families on specific taxonomic level.")
+                # Include only rows with selected taxonomic level
+                network_dataset = genefamiliesTaxonomy(dataset, network_taxonomy_level)
+
+        with network_menu[1]:
+            method = st.selectbox("Select measure:", options=NETWORK_METHODS,
+                                  help="Spearman and Pearson correlation of abundances, or proportionality (rho) of log-ratio transformed abundances which respects compositional data.")
+
+        with network_menu[2]:
+            threshold = st.slider("Minimal absolute association:", min_value=0.3, max_value=0.95, value=0.7, step=0.05,
+                                  help="Only pairs of features with stronger association are connected.")
+
+        with network_menu[3]:
+            max_edges = st.selectbox("Maximal number of edges:", options=[250, 500, 1000], index=1,
+                                     help="Only the strongest edges are kept and drawn.")
+
+        # Drop rare and low abundant features before correlating
+        network_dataset, prefilter_report = prefilter_features(network_dataset, **st.session_state.prefilter)
+        show_prefilter_report(prefilter_report)
+
+        # Correlate all pairs of features in the background
+        network_job = run_in_background("network", computeNetwork, network_dataset, method, threshold, max_edges)
+        network_results = wait_for_job(network_job, "Calculating network...")
+
+        if network_results is not None:
+            edges, layout = network_results
+            if edges.empty:
+                st.markdown("No pair of features reaches the minimal association.")
+            else:
+                st.caption(f"{len(layout)} features connected by {len(edges)} edges.")
+                st.plotly_chart(plotNetwork(edges, layout), use_container_width=True)
+                st.dataframe(edges, hide_index=True, use_container_width=True)
+    else:
+        # If pathcoverage file is selected, show this message
+        st.markdown("## Please select different file.")
+
 
-                # Include only selected columns
-                selected_dataset = differential_dataset[[str(first_sample), str(second_sample)]]
+# Section for differential expression
+@st.fragment
+def differentialSection(dataset, select_file):
+    """Shows differential heatmap of two samples. Interaction with its widgets reruns only this section.
 
-                # Create and show heatmap
-                plotDifferentialHeatmap(selected_dataset, n_top_rows)
+    Args:
+        dataset (DataFrame): Whole table (file)
+        select_file (str): Name of selected file
+    """
+
+    # Load currently selected dataset to session state variable 
+    st.session_state.differential_dataset = dataset
+
+    # Columns for buttons
+    differential_menu = st.columns(3)
+
+    with differential_menu[0]:
+        # Select first sample
+        first_sample = st.selectbox("Select first sample:", options=st.session_state.differential_dataset.columns, placeholder="-----", help="Select first sample to calculate difference.")
     
-            else:
-                # If pathcoverage file is selected, show this message
-                st.markdown("## Please select different file.")
+    with differential_menu[1]:
+        # Select second sample
+        second_sample = st.selectbox("Select second sample:", options=st.session_state.differential_dataset.columns, placeholder="-----", help="Select second sample to calculate difference.")
+    
+    with differential_menu[2]:
+        # Select number of top rows
+        n_top_rows = st.selectbox("Select number of top rows:", options=[10, 25, 50], help="Number of top rows from difference column ordered descending.")
+
+    # If sample names are the same, show this message
+    if first_sample == second_sample:
+        st.markdown("## Please select two different columns")
+
+    else:
+        if "metaphlan" in select_file:
+
+            # Select box for selecting taxonomy level
+            taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                        options=["Taxonomic Level 1 (Kingdom)", "Taxonomic Level 2 (Phylum)", "Taxonomic Level 3 (Class)", "Taxonomic Level 4 (Order)", "Taxonomic Level 5 (Family)", "Taxonomic Level 6 (Genus)", "Taxonomic Level 7 (Species)", "Taxonomic Level 8 (All)"],
+                                        key="diff", help="Select taxonomic level to calculate difference on.")
             
+            # Include only rows with selected taxonomic level
+            differential_dataset = metaphlanTaxonomy(dataset,taxonomy_level)
+
+            # Drop rare and low abundant features
+            differential_dataset, prefilter_report = prefilter_features(differential_dataset, **st.session_state.prefilter)
+            show_prefilter_report(prefilter_report)
+
+            # Include only selected columns
+            selected_dataset = differential_dataset[[str(first_sample), str(second_sample)]]
+
+            # Create and show heatmap
+            plotDifferentialHeatmap(selected_dataset, n_top_rows)
+
+        elif "pathabundance" in select_file:
+            # Select box for selecting taxonomy level
+            taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                        options=["Taxonomic Level 1"],
+                                        key="diff", help="Select taxonomic level to calculate difference on.")
             
+            # Include only rows with selected taxonomic level
+            differential_dataset = pathabundaceTaxonomy(dataset, taxonomy_level)
+
+            # Drop rare and low abundant features
+            differential_dataset, prefilter_report = prefilter_features(differential_dataset, **st.session_state.prefilter)
+            show_prefilter_report(prefilter_report)
+
+            # Include only selected columns
+            selected_dataset = differential_dataset[[str(first_sample), str(second_sample)]]
+
+            # Create and show heatmap
+            plotDifferentialHeatmap(selected_dataset, n_top_rows)
+
+        elif "genefamilies" in select_file:
+        
+            # Select box for selecting taxonomy level
+            taxonomy_level = st.selectbox("Select taxonomic level:", 
+                                            options=["Taxonomic Level 1", "Taxonomic Level 2 (Genus & Species)"],
+                                            key="diff", help="Select taxonomic level to calculate difference on.")
+            
+            # Include only rows with selected taxonomic level
+            differential_dataset = genefamiliesTaxonomy(dataset, taxonomy_level)
+
+            # Drop rare and low abundant features
+            differential_dataset, prefilter_report = prefilter_features(differential_dataset, **st.session_state.prefilter)
+            show_prefilter_report(prefilter_report)
+
+            # Include only selected columns
+            selected_dataset = differential_dataset[[str(first_sample), str(second_sample)]]
+
+            # Create and show heatmap
+            plotDifferentialHeatmap(selected_dataset, n_top_rows)
+
+        else:
+            # If pathcoverage file is selected, show this message
+            st.markdown("## Please select different file.")
+
+
+# Initialize the session state dictionary if not already present
+if "uploaded_files" not in st.session_state:
+    st.session_state.uploaded_files = {}
+
+# Widget to upload single file
+uploaded_files = st.sidebar.file_uploader("Select TSV file to upload", accept_multiple_files=True, type=["tsv", "csv"])
+
+# Upload multiple files and save the to dictionary
+if uploaded_files:
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name not in st.session_state.uploaded_files:
+            st.session_state.uploaded_files[uploaded_file.name] = uploaded_file.getvalue()
+    
+    
+# Files are uploaded and one file is selected
+if st.session_state.uploaded_files:
+    file_names = list(st.session_state.uploaded_files.keys())
+
+    with st.sidebar:
+        select_file = st.selectbox("Select file:", options=file_names)
+
+    file = st.session_state.uploaded_files[select_file]
+    full_dataset = load_data(file, select_file)
+
+    # Gene families are summed into groups of the selected mapping file before any analysis
+    mapping_content = regroup_sidebar(select_file)
+    if mapping_content is not None:
+        full_dataset = regroup_table(full_dataset, mapping_content)
+
+    # Define session state variables for each statistical analysis
+    if "metadata" not in st.session_state:
+        st.session_state.metadata = None
+    
+    if "metadata_uploaded" not in st.session_state:
+        st.session_state.metadata_uploaded = False
+
+    # Samples are selected once, all sections analyse only the selected columns
+    dataset = select_samples(full_dataset, st.session_state.metadata, sample_filter_sidebar())
+    show_sample_report(full_dataset, dataset)
+
+    # Pre-filter settings shared with Graphs
+    prefilter_sidebar()
+
+    # Export and restore of computed results
+    snapshot_sidebar()
+
+    # Print title of the page
+    st.title("Statistics")
+
+    # Select analysis, only the selected section is executed
+    analysis = st.radio("Analysis:", options=["Alpha Diversity", "Beta Diversity", "Co-occurrence Network", "Differential Expression"], horizontal=True,
+                        key="statistics_tab", label_visibility="collapsed")
+
+    match analysis:
+        case "Alpha Diversity":
+            alphaDiversitySection(dataset, select_file)
+        case "Beta Diversity":
+            betaDiversitySection(dataset, select_file)
+        case "Co-occurrence Network":
+            networkSection(dataset, select_file)
+        case "Differential Expression":
+            differentialSection(dataset, select_file)
+
 else:
     # If no file is loaded display this title
     st.title("Please upload data in the sidebar")
\ No newline at end of file
@@ -0,0 +1 @@
+# Shared helpers used by Overview.py and the pages
@@ -0,0 +1,106 @@
+# Import libraries
+import streamlit as st
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# Number of indexes kept in memory, one per table (samples are selected from the index)
+CONTRIBUTION_INDEX_CACHE_SIZE = 4
+
+# Function to index stratified rows of HUMAnN table
+def build_contribution_index(table):
+    """Parses stratified rows (feature|taxon) into sparse matrix of contributions with rows
+    grouped by feature and offsets of every feature and taxon (CSR-like), so contributions
+    of one feature or one taxon are found without scanning the table.
+
+    Args:
+        table (DataFrame): HUMAnN genefamilies or pathabundance table
+
+    Returns:
+        dict: Feature and taxon names, sparse contributions (stratified rows x samples),
+            taxon of every row, offsets of features, rows of taxa with their offsets
+    """
+    names = table.index.to_series().astype(str)
+    stratified = np.flatnonzero(names.str.contains("|", regex=False).to_numpy())
+    parts = names.iloc[stratified].str.split("|", n=1, expand=True) if len(stratified) else pd.DataFrame({0: [], 1: []})
+
+    feature_codes, features = pd.factorize(parts[0], sort=True)
+    taxon_codes, taxa = pd.factorize(parts[1], sort=True)
+
+    # Rows grouped by feature, offsets point to the first row of every feature
+    order = np.argsort(feature_codes, kind="stable")
+    feature_offsets = np.searchsorted(feature_codes[order], np.arange(len(features) + 1))
+    row_taxa = taxon_codes[order]
+
+    # Rows of the grouped matrix grouped once more by taxon
+    taxon_rows = np.argsort(row_taxa, kind="stable")
+    taxon_offsets = np.searchsorted(row_taxa[taxon_rows], np.arange(len(taxa) + 1))
+
+    values = sparse.csr_matrix(table.iloc[stratified[order]].to_numpy(dtype=float))
+    return {"features": pd.Index(features),
+            "taxa": pd.Index(taxa),
+            "samples": table.columns,
+            "values": values,
+            "row_features": feature_codes[order],
+            "row_taxa": row_taxa,
+            "feature_offsets": feature_offsets,
+            "taxon_rows": taxon_rows,
+            "taxon_offsets": taxon_offsets}
+
+
+# Cached version of the index, built once per table
+@st.cache_resource(show_spinner="Indexing stratified rows...", max_entries=CONTRIBUTION_INDEX_CACHE_SIZE)
+def contribution_index(table):
+    return build_contribution_index(table)
+
+
+# Function to find contributions of taxa to one feature
+def feature_contributions(index, feature, samples=None):
+    """Returns contributions of all taxa to the feature.
+
+    Args:
+        index (dict): Index from contribution_index
+        feature (str): Gene family or pathway
+        samples (list, optional): Samples (columns) to return, all samples by default
+
+    Returns:
+        DataFrame: Taxa in rows and samples in columns
+    """
+    position = index["features"].get_loc(feature)
+    rows = slice(index["feature_offsets"][position], index["feature_offsets"][position + 1])
+    contributions = pd.DataFrame(index["values"][rows].toarray(), index=index["taxa"][index["row_taxa"][rows]], columns=index["samples"])
+    return contributions if samples is None else contributions[samples]
+
+
+# Function to find features a taxon contributes to
+def taxon_features(index, taxon, samples=None):
+    """Returns contributions of the taxon to all features.
+
+    Args:
+        index (dict): Index from contribution_index
+        taxon (str): Taxon of stratified rows, e.g. g__Genus.s__species or unclassified
+        samples (list, optional): Samples (columns) to return, all samples by default
+
+    Returns:
+        DataFrame: Features in rows and samples in columns
+    """
+    position = index["taxa"].get_loc(taxon)
+    rows = index["taxon_rows"][index["taxon_offsets"][position]:index["taxon_offsets"][position + 1]]
+    contributions = pd.DataFrame(index["values"][rows].toarray(), index=index["features"][index["row_features"][rows]], columns=index["samples"])
+    return contributions if samples is None else contributions[samples]
+
+
+# Function to keep largest rows and sum the rest
+def top_contributors(contributions, n_rows):
+    """Keeps n_rows rows with the highest total and sums the remaining rows into "Other".
+
+    Returns:
+        DataFrame: At most n_rows + 1 rows
+    """
+    order = contributions.sum(axis=1).sort_values(ascending=False).index
+    top = contributions.loc[order[:n_rows]]
+    if len(order) > n_rows:
+        top = pd.concat([top, contributions.loc[order[n_rows:]].sum().to_frame("Other").T])
+    return top
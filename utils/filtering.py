@@ -0,0 +1,82 @@
+# Import libraries
+import streamlit as st
+
+import numpy as np
+
+from utils.summary import row_summary
+
+
+# Default thresholds (nothing is removed), prevalence is fraction of samples
+DEFAULT_PREFILTER = {"min_prevalence": 0.0, "min_mean": 0.0, "min_relative": 0.0}
+
+
+# Function to drop rare and low abundant features
+def compute_prefilter(table, min_prevalence=0.0, min_mean=0.0, min_relative=0.0):
+    """Drops rows (features) below minimum prevalence, mean abundance or maximal relative
+    abundance in any sample.
+
+    Args:
+        table (DataFrame): Table with features in rows and samples in columns
+        min_prevalence (float): Minimal fraction of samples with non-zero abundance (0 - 1)
+        min_mean (float): Minimal mean abundance
+        min_relative (float): Minimal relative abundance [%] reached in at least one sample
+
+    Returns:
+        tuple: Filtered DataFrame and dictionary describing what was removed
+    """
+    summary = row_summary(table)
+    keep = (summary["Prevalence"].to_numpy() >= min_prevalence) & (summary["Mean abundance"].to_numpy() >= min_mean)
+
+    if min_relative > 0:
+        values = table.to_numpy(dtype=float)
+        column_sums = values.sum(axis=0)
+        relative = np.divide(values, column_sums, out=np.zeros_like(values), where=column_sums > 0) * 100
+        keep &= relative.max(axis=1, initial=0) >= min_relative
+
+    filtered = table.iloc[keep] if not keep.all() else table
+    removed = int(len(table) - keep.sum())
+    report = {"features": len(table),
+              "removed_features": removed,
+              "removed_cells": removed * table.shape[1],
+              "removed_bytes": int(table.memory_usage(index=False).sum() * removed / max(len(table), 1))}
+    return filtered, report
+
+
+# Cached version of the pre-filter, computed once per table and thresholds
+@st.cache_data(show_spinner="Filtering features...")
+def prefilter_features(table, min_prevalence=0.0, min_mean=0.0, min_relative=0.0):
+    return compute_prefilter(table, min_prevalence, min_mean, min_relative)
+
+
+# Function to show pre-filter settings shared by pages
+def prefilter_sidebar():
+    """Shows pre-filter thresholds in the sidebar. Thresholds are stored in session state,
+    so Graphs and Statistics use the same settings.
+
+    Returns:
+        dict: Thresholds to pass to prefilter_features
+    """
+    if "prefilter" not in st.session_state:
+        st.session_state.prefilter = dict(DEFAULT_PREFILTER)
+    settings = st.session_state.prefilter
+
+    with st.sidebar.expander("Feature pre-filter"):
+        settings["min_prevalence"] = st.number_input("Minimum prevalence [%]", min_value=0.0, max_value=100.0, value=settings["min_prevalence"] * 100, step=5.0,
+                                                     help="Drops features with non-zero abundance in fewer samples.") / 100
+        settings["min_mean"] = st.number_input("Minimum mean abundance", min_value=0.0, value=settings["min_mean"],
+                                               help="Drops features with lower mean abundance (per row).")
+        settings["min_relative"] = st.number_input("Minimum relative abundance [%]", min_value=0.0, max_value=100.0, value=settings["min_relative"], step=0.1,
+                                                   help="Drops features which do not reach this relative abundance in any sample.")
+    return settings
+
+
+# Function to print what the pre-filter removed
+def show_prefilter_report(report):
+    """Prints number of removed features and size of removed part of the matrix.
+
+    Args:
+        report (dict): Report from prefilter_features
+    """
+    if report["removed_features"] > 0:
+        st.caption(f"Pre-filter removed {report['removed_features']} of {report['features']} features "
+                   f"({report['removed_cells']} matrix cells, {report['removed_bytes'] / 2**20:.1f} MB).")
@@ -0,0 +1,152 @@
+# Import libraries
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from plotly.colors import hex_to_rgb, sample_colorscale
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import pdist
+
+
+# Tables with more cells are drawn as image by default
+RASTER_MIN_CELLS = 200000
+
+# Rows and columns are ordered by hierarchical clustering up to this count, larger tables keep their order
+CLUSTER_MAX_ROWS = 4000
+
+# Size of the rendered image in pixels
+RASTER_HEIGHT = 1000
+RASTER_WIDTH = 1200
+
+
+# Function to order rows by hierarchical clustering
+def cluster_order(values, metric):
+    """Returns order of rows given by leaves of average linkage dendrogram. Rows keep their
+    order when there are too many of them for pairwise distances.
+
+    Args:
+        values (ndarray): Rows to order
+        metric (str): Distance metric accepted by scipy pdist
+
+    Returns:
+        ndarray: Positions of rows in the new order
+    """
+    if len(values) < 3 or len(values) > CLUSTER_MAX_ROWS:
+        return np.arange(len(values))
+
+    # Constant rows have undefined correlation, they are treated as uncorrelated
+    distances = np.nan_to_num(pdist(values, metric=metric), nan=1.0)
+    return leaves_list(linkage(distances, method="average"))
+
+
+# Function to build pyramid of aggregated rows
+def build_tile_pyramid(job, table, metric):
+    """Orders rows and columns of the table and aggregates rows by pairs into levels of
+    halving resolution. Levels keep sums and row counts, so any window of rows can be
+    aggregated to the screen from the coarsest level which still has enough rows.
+
+    Args:
+        job (Job): Background job used to report progress
+        table (DataFrame): Table with features in rows and samples in columns
+        metric (str): Distance metric for ordering rows and columns
+
+    Returns:
+        dict: Ordered row and column names, sums and counts of every level and value range
+    """
+    values = np.log1p(np.clip(table.to_numpy(dtype=np.float32), 0, None))
+
+    job.report(0.1, f"Ordering {len(values)} rows...")
+    row_order = cluster_order(values, metric)
+    job.report(0.5, f"Ordering {values.shape[1]} columns...")
+    column_order = cluster_order(values.T, metric)
+    values = values[row_order][:, column_order]
+
+    job.report(0.7, "Aggregating tiles...")
+    sums, counts = [values], [np.ones(len(values), dtype=np.int64)]
+    while len(sums[-1]) > 1:
+        starts = np.arange(0, len(sums[-1]), 2)
+        sums.append(np.add.reduceat(sums[-1], starts, axis=0))
+        counts.append(np.add.reduceat(counts[-1], starts))
+
+    return {"rows": np.asarray(table.index[row_order].astype(str)),
+            "columns": np.asarray(table.columns[column_order].astype(str)),
+            "sums": sums,
+            "counts": counts,
+            "range": [float(values.min(initial=0)), float(values.max(initial=0))]}
+
+
+# Function to aggregate blocks of an array to a given number of bins
+def _bin_edges(length, bins):
+    return np.unique(np.linspace(0, length, min(bins, length) + 1).astype(int))[:-1]
+
+
+# Function to aggregate window of rows to the pixel grid
+def render_window(pyramid, start, stop, height=RASTER_HEIGHT, width=RASTER_WIDTH):
+    """Means of the table in the window of rows aggregated to at most height x width pixels.
+
+    Args:
+        pyramid (dict): Result of build_tile_pyramid
+        start (int): First row of the window
+        stop (int): Row after the last row of the window
+
+    Returns:
+        tuple: Aggregated values (rows x columns) and number of table rows per image row
+    """
+    # Coarsest level which still has at least one row per pixel
+    level = int(max(0, min(np.floor(np.log2(max((stop - start) / height, 1))), len(pyramid["sums"]) - 1)))
+    scale = 2**level
+    first, last = start // scale, -(-stop // scale)
+    sums = pyramid["sums"][level][first:last]
+    counts = pyramid["counts"][level][first:last]
+
+    row_edges = _bin_edges(len(sums), height)
+    means = np.add.reduceat(sums, row_edges, axis=0) / np.add.reduceat(counts, row_edges)[:, None]
+    if means.shape[1] > width:
+        column_edges = _bin_edges(means.shape[1], width)
+        means = np.add.reduceat(means, column_edges, axis=1) / np.diff(np.append(column_edges, means.shape[1]))
+    return means, (stop - start) / len(means)
+
+
+# Function to draw aggregated values as an image
+def raster_figure(pyramid, start, stop, colorscale="Sunset"):
+    """Creates figure with PNG image of the window of rows, colors are shared by all windows.
+
+    Args:
+        pyramid (dict): Result of build_tile_pyramid
+        start (int): First row of the window
+        stop (int): Row after the last row of the window
+        colorscale (str): Name of Plotly colorscale
+
+    Returns:
+        Figure: Heatmap image with row numbers on y axis and samples on x axis
+    """
+    means, rows_per_pixel = render_window(pyramid, start, stop)
+    low, high = pyramid["range"]
+    scaled = np.clip((means - low) / (high - low or 1), 0, 1)
+
+    # Lookup table of 256 colors from the colorscale
+    palette = np.array([hex_to_rgb(color) if color.startswith("#") else _parse_rgb(color)
+                        for color in sample_colorscale(colorscale, np.linspace(0, 1, 256))], dtype=np.uint8)
+    image = palette[(scaled * 255).astype(np.uint8)]
+
+    fig = px.imshow(image, binary_string=True)
+    # Rows are numbered from 1 like in the legend, pixel centers lie in the middle of their rows
+    column_step = len(pyramid["columns"]) / image.shape[1]
+    fig.update_traces(x0=column_step / 2, dx=column_step, y0=start + 0.5 + rows_per_pixel / 2, dy=rows_per_pixel,
+                      hovertemplate="Row %{y:.0f}<extra></extra>")
+    fig.update_layout(height=RASTER_HEIGHT, margin=dict(l=60, r=20, t=20, b=120))
+    fig.update_yaxes(title="Row", range=[stop + 0.5, start + 0.5])
+    if image.shape[1] == len(pyramid["columns"]):
+        fig.update_xaxes(tickvals=np.arange(len(pyramid["columns"])) + 0.5, ticktext=list(pyramid["columns"]), tickangle=-90)
+    else:
+        fig.update_xaxes(title="Sample (position)")
+    return fig
+
+
+# Function to parse colors in "rgb(r, g, b)" format
+def _parse_rgb(color):
+    return [int(float(part)) for part in color[color.index("(") + 1:color.index(")")].split(",")[:3]]
+
+
+# Function to create table of rows shown in the heatmap
+def legend_table(row_names):
+    return pd.DataFrame({"Row": np.arange(1, len(row_names) + 1), "Name": row_names})
@@ -0,0 +1,414 @@
+# Import libraries
+import streamlit as st
+
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from utils.parallel import start_process
+
+
+# Memory of finished results kept by the job runner (shared by all sessions)
+RESULTS_MEMORY_BYTES = 1024 * 2**20
+
+# Seconds between checks of cancellation while a computation runs in a separate process
+PROCESS_POLL_SECONDS = 0.2
+
+# Steps on smaller tables run in the job thread, starting a process would take longer than them
+PROCESS_MIN_CELLS = 10**6
+
+
+class JobCancelled(Exception):
+    """Raised inside of a running job after it was cancelled."""
+
+
+class Job:
+    """Background computation with progress reporting and cooperative cancellation."""
+
+    def __init__(self, key, parameters=None):
+        self.key = key
+        self.parameters = parameters or []
+        self.future = None
+        self.progress = 0.0
+        self.message = "Waiting for a free worker..."
+        self.sessions = set()
+        self.size = 0
+        self._cancel_event = threading.Event()
+
+    def report(self, progress, message=None):
+        """Updates progress of the job. Called by the computation between its steps,
+        raises JobCancelled when the job is no longer needed.
+
+        Args:
+            progress (float): Finished fraction of the computation (0 - 1)
+            message (str, optional): Description of the current step
+        """
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.key)
+        self.progress = min(max(progress, 0.0), 1.0)
+        if message:
+            self.message = message
+
+    def cancel(self):
+        self._cancel_event.set()
+        self.future.cancel()
+
+    @classmethod
+    def finished(cls, key, result, parameters=None):
+        """Creates job which is already finished with the result."""
+        job = cls(key, parameters)
+        job.future = Future()
+        job.future.set_result(result)
+        job.progress = 1.0
+        job.size = result_bytes(result)
+        return job
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+
+class JobRunner:
+    """Thread pool running jobs in the background. Jobs are identified by key, so a job
+    with identical parameters is shared instead of being started again. Finished results
+    are kept up to a number of results and their memory."""
+
+    def __init__(self, max_workers=None, max_results=32, max_result_bytes=RESULTS_MEMORY_BYTES):
+        self.max_results = max_results
+        self.max_result_bytes = max_result_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(), thread_name_prefix="dashboard-job")
+        self._jobs = OrderedDict()
+        # Reentrant, callbacks of futures finished or cancelled under the lock run at once
+        self._lock = threading.RLock()
+
+    def submit(self, key, session, func, *args, **kwargs):
+        """Starts func(job, *args, **kwargs) in the background or reuses in-flight or
+        finished job with the same key.
+
+        Args:
+            key (tuple): Identifier of the computation and its parameters
+            session (str): Identifier of the session using the job
+            func (function): Computation, receives the Job as first argument
+
+        Returns:
+            Job: Submitted or reused job
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.cancelled or (job.done() and job.future.exception() is not None):
+                job = Job(key, describe(*args, *kwargs.values()))
+                job.future = self._executor.submit(self._run, job, func, args, kwargs)
+                job.future.add_done_callback(lambda future, job=job: self._measure(job))
+                self._jobs[key] = job
+
+            job.sessions.add(session)
+            self._jobs.move_to_end(key)
+            self._evict()
+            return job
+
+    def run(self, key, session, func, *args, **kwargs):
+        """Computes func(*args, **kwargs) in the calling thread, unless finished result
+        with the same key exists. Result is kept like result of background job.
+
+        Returns:
+            Result of func
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is not None and job.done() and not job.cancelled and job.future.exception() is None:
+            job.sessions.add(session)
+            return job.result()
+
+        result = func(*args, **kwargs)
+        self.store(key, result, session, describe(*args, *kwargs.values()))
+        return result
+
+    def store(self, key, result, session=None, parameters=None):
+        """Stores finished result under the key."""
+        job = Job.finished(key, result, parameters)
+        if session is not None:
+            job.sessions.add(session)
+
+        with self._lock:
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._evict()
+
+    def finished(self, session=None):
+        """Returns successfully finished jobs, optionally only jobs used by the session."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs
+                if job.done() and not job.cancelled and job.future.exception() is None
+                and (session is None or session in job.sessions)]
+
+    def release(self, key, session):
+        """Session no longer needs the job, it is cancelled when nobody else uses it."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            job.sessions.discard(session)
+            if not job.sessions and not job.done():
+                del self._jobs[key]
+                job.cancel()
+
+    def _run(self, job, func, args, kwargs):
+        job.report(0.0, "Running...")
+        result = func(job, *args, **kwargs)
+        job.progress = 1.0
+        return result
+
+    def _measure(self, job):
+        # Size of the result is measured once in the worker thread, outside of the lock
+        if not job.future.cancelled() and job.future.exception() is None:
+            job.size = result_bytes(job.result())
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        # Oldest finished jobs are dropped above the number or memory limit, the newest finished
+        # job is always kept and running jobs are never evicted
+        finished = [key for key, job in self._jobs.items() if job.done()]
+        total = sum(self._jobs[key].size for key in finished)
+        for key in finished[:-1]:
+            if len(finished) <= self.max_results and total <= self.max_result_bytes:
+                break
+            total -= self._jobs[key].size
+            finished.remove(key)
+            del self._jobs[key]
+
+
+# Job runner shared by all sessions of the server
+@st.cache_resource
+def get_job_runner():
+    return JobRunner()
+
+
+# Function to estimate memory of a result
+def result_bytes(value):
+    """Returns memory of tables and arrays in the result, other objects (figures, distance
+    matrices, ordinations) are measured by the size of their pickle.
+
+    Returns:
+        int: Size of the result in bytes
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(result_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(result_bytes(item) for item in value.values())
+    if value is None or isinstance(value, (bool, int, float, str, np.generic)):
+        return 0
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+# Function to run step which does not report progress, so that it can be cancelled
+def run_in_process(job, func, *args, **kwargs):
+    """Computes func(*args, **kwargs) in a separate process, while the job thread checks
+    cancellation of the job. Cancelled job terminates the process, so long library calls
+    (clustering, distances, ordination) do not keep computing stale results.
+
+    Args:
+        job (Job): Job running the step
+        func (function): Importable function (not defined in a page script)
+
+    Returns:
+        Result of func
+    """
+    process, receiver = start_process(func, args, kwargs)
+    try:
+        while not receiver.poll(PROCESS_POLL_SECONDS):
+            if not process.is_alive() and not receiver.poll(0):
+                raise RuntimeError(f"Process computing {func.__name__} exited without result.")
+            # Raises JobCancelled when the job is no longer needed
+            job.report(job.progress)
+        success, value = receiver.recv()
+    except BaseException:
+        process.terminate()
+        raise
+    finally:
+        process.join()
+        receiver.close()
+
+    if not success:
+        raise value
+    return value
+
+
+# Function to run step on a table, large steps can be cancelled
+def run_interruptible(job, cells, func, *args, **kwargs):
+    """Runs func(*args, **kwargs) in a separate process (run_in_process) when the table has
+    at least PROCESS_MIN_CELLS cells, otherwise in the job thread.
+
+    Args:
+        job (Job): Job running the step
+        cells (int): Number of cells of the processed table
+        func (function): Importable function (not defined in a page script)
+
+    Returns:
+        Result of func
+    """
+    if cells < PROCESS_MIN_CELLS:
+        return func(*args, **kwargs)
+    return run_in_process(job, func, *args, **kwargs)
+
+
+# Function to create identifier of computation parameters
+def fingerprint(*values):
+    """Hashes parameters of a computation. Tables, arrays and bytes are hashed by their whole
+    content, so different tables never share a key.
+
+    Returns:
+        str: Hexadecimal digest of all values
+    """
+    digest = hashlib.sha1()
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            frame = value.to_frame() if isinstance(value, pd.Series) else value
+            digest.update(repr((type(value).__name__, frame.shape, list(frame.columns), list(frame.dtypes.astype(str)))).encode())
+            digest.update(pd.util.hash_pandas_object(frame.index).to_numpy().tobytes())
+            for position in range(frame.shape[1]):
+                column = frame.iloc[:, position]
+                # Numeric columns are hashed from their buffer, other columns value by value
+                if isinstance(column.dtype, np.dtype) and column.dtype.kind in "biufc":
+                    digest.update(np.ascontiguousarray(column.to_numpy()))
+                else:
+                    digest.update(pd.util.hash_pandas_object(column, index=False).to_numpy().tobytes())
+        elif isinstance(value, np.ndarray):
+            digest.update(repr((value.shape, value.dtype)).encode())
+            digest.update(np.ascontiguousarray(value))
+        elif isinstance(value, (bytes, bytearray)):
+            digest.update(value)
+        else:
+            digest.update(repr(value).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+# Function to describe parameters of a computation for people
+def describe(*values):
+    """Returns short description of every value, tables are described by their shape."""
+    descriptions = []
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+            descriptions.append(f"{type(value).__name__} {value.shape}")
+        else:
+            descriptions.append(repr(value))
+    return descriptions
+
+
+# Function to identify current session
+def session_id():
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+
+# Function to keep result restored from snapshot for current session only
+def restore_result(key, result, parameters=None):
+    """Stores result in session state, it is used instead of computation with the same
+    key in this session. Other sessions sharing the job runner are not affected."""
+    if "restored_jobs" not in st.session_state:
+        st.session_state.restored_jobs = {}
+    st.session_state.restored_jobs[key] = Job.finished(key, result, parameters)
+
+
+# Function to list results restored in current session
+def restored_jobs():
+    return list(st.session_state.get("restored_jobs", {}).values())
+
+
+# Function to run computation in the background for current session
+def run_in_background(slot, func, *args, **kwargs):
+    """Runs func(job, *args, **kwargs) in the background. Each session has one job per
+    slot, job of the slot started with different parameters is cancelled.
+
+    Args:
+        slot (str): Name of the place on the page which shows the result
+        func (function): Computation, receives the Job as first argument
+
+    Returns:
+        Job: Running or finished job
+    """
+    if "jobs" not in st.session_state:
+        st.session_state.jobs = {}
+
+    runner = get_job_runner()
+    key = (func.__name__, fingerprint(*args, *sorted(kwargs.items())))
+
+    # Cancel stale job when the user changed inputs
+    previous = st.session_state.jobs.get(slot)
+    if previous is not None and previous != key:
+        runner.release(previous, session_id())
+
+    st.session_state.jobs[slot] = key
+    restored = st.session_state.get("restored_jobs", {}).get(key)
+    if restored is not None:
+        return restored
+    return runner.submit(key, session_id(), func, *args, **kwargs)
+
+
+# Function to run short computation with result kept by the job runner
+def run_cached(func, *args, **kwargs):
+    """Computes func(*args, **kwargs) in the script thread. Result is kept next to results
+    of background jobs, so it is shared by sessions and saved to snapshots.
+
+    Returns:
+        Result of func
+    """
+    key = (func.__name__, fingerprint(*args, *sorted(kwargs.items())))
+    restored = st.session_state.get("restored_jobs", {}).get(key)
+    if restored is not None:
+        return restored.result()
+    return get_job_runner().run(key, session_id(), func, *args, **kwargs)
+
+
+# Function to show progress of the job
+def wait_for_job(job, label="Computing...", timeout=0.2):
+    """Returns result of the job when it is finished. Otherwise shows progress bar and
+    returns None, the page is rerun as soon as the job finishes.
+
+    Args:
+        job (Job): Job from run_in_background
+        label (str): Text shown next to the progress bar
+        timeout (float): Seconds to wait before showing progress bar for short jobs
+
+    Returns:
+        Result of the job or None while the job is running
+    """
+    wait([job.future], timeout=timeout)
+    if job.done():
+        return job.result()
+
+    _job_progress(job, label)
+    return None
+
+
+@st.fragment(run_every=0.5)
+def _job_progress(job, label):
+    # Rerun whole page to show the result
+    if job.done():
+        st.rerun()
+    st.progress(job.progress, text=f"{label} {job.message}")
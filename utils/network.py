@@ -0,0 +1,155 @@
+# Import libraries
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+
+# Memory for blocks of the correlation matrix computed at the same time
+NETWORK_MEMORY_BYTES = 256 * 2**20
+
+# Arrays of the size of a block alive at once (block and denominators of rho), thresholding works in place
+NETWORK_BLOCK_ARRAYS = 2
+
+# Correlation measures offered on the page
+NETWORK_METHODS = ["Spearman", "Pearson", "Proportionality (rho)"]
+
+
+# Function to transform rows so that their dot products are the selected association
+def _standardize(values, method):
+    """Returns rows scaled so that dot product of two rows is their Spearman or Pearson
+    correlation, or proportionality rho of their centered log-ratio abundances.
+
+    Args:
+        values (ndarray): Abundances (features x samples)
+        method (str): One of NETWORK_METHODS
+
+    Returns:
+        ndarray: Standardized rows
+    """
+    if method == "Proportionality (rho)":
+        # Zeros are replaced by half of the smallest non-zero abundance before log-ratio
+        positive = values[values > 0]
+        pseudocount = positive.min() / 2 if positive.size else 1.0
+        logs = np.log(np.where(values > 0, values, pseudocount))
+        clr = logs - logs.mean(axis=0)
+        centered = clr - clr.mean(axis=1, keepdims=True)
+
+        # rho = 2 cov(x, y) / (var(x) + var(y)) is not a dot product, variances are kept for the blocks
+        return centered, (centered**2).sum(axis=1)
+
+    if method == "Spearman":
+        values = rankdata(values, axis=1)
+    centered = values - values.mean(axis=1, keepdims=True)
+    norms = np.sqrt((centered**2).sum(axis=1, keepdims=True))
+    return np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0), None
+
+
+# Function to keep only strongest edges
+def _strongest(edges, max_edges):
+    if len(edges[2]) <= max_edges:
+        return edges
+    keep = np.argpartition(-np.abs(edges[2]), max_edges - 1)[:max_edges]
+    return tuple(part[keep] for part in edges)
+
+
+# Function to compute co-occurrence network of features
+def correlation_edges(table, method="Spearman", threshold=0.7, max_edges=1000, job=None):
+    """Computes association of all pairs of features (rows) in blocks of rows processed in
+    parallel. Only pairs with absolute association above the threshold are kept, so the
+    dense matrix of all pairs is never held in memory.
+
+    Args:
+        table (DataFrame): Table with features in rows and samples in columns
+        method (str): One of NETWORK_METHODS
+        threshold (float): Minimal absolute association of an edge
+        max_edges (int): Number of strongest edges to keep
+        job (Job, optional): Background job used to report progress
+
+    Returns:
+        DataFrame: Edges with columns Source, Target and Weight
+    """
+    values = table.to_numpy(dtype=float)
+    standardized, variances = _standardize(values, method)
+    n_features = len(standardized)
+
+    # Blocks of all workers fit into the memory limit together
+    workers = os.cpu_count() or 1
+    block_rows = max(1, NETWORK_MEMORY_BYTES // (8 * NETWORK_BLOCK_ARRAYS * max(n_features, 1) * workers))
+    starts = list(range(0, n_features, block_rows))
+
+    def block_edges(start):
+        stop = min(start + block_rows, n_features)
+        # Only pairs with the second feature after the first one (upper triangle)
+        block = standardized[start:stop] @ standardized[start:].T
+        if variances is not None:
+            # Pairs of constant features (zero variances) keep zero association
+            denominators = variances[start:stop, None] + variances[None, start:]
+            block *= 2
+            np.divide(block, denominators, out=block, where=denominators > 0)
+            del denominators
+
+        # Masks take one byte per pair, pairs below the diagonal are dropped in place
+        strong = block >= threshold
+        strong |= block <= -threshold
+        strong[:, :stop - start] &= np.triu(np.ones((stop - start, stop - start), dtype=bool), k=1)
+        rows, columns = np.nonzero(strong)
+        return _strongest((rows + start, columns + start, block[rows, columns]), max_edges)
+
+    sources, targets, weights = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for finished, (block_sources, block_targets, block_weights) in enumerate(executor.map(block_edges, starts), start=1):
+            sources, targets, weights = _strongest((np.concatenate([sources, block_sources]),
+                                                    np.concatenate([targets, block_targets]),
+                                                    np.concatenate([weights, block_weights])), max_edges)
+            if job is not None:
+                job.report(0.7 * finished / len(starts), f"Correlated {finished} of {len(starts)} blocks of features...")
+
+    order = np.argsort(-np.abs(weights), kind="stable")
+    names = np.asarray(table.index.astype(str))
+    return pd.DataFrame({"Source": names[sources[order]], "Target": names[targets[order]], "Weight": weights[order]})
+
+
+# Function to place nodes of the network
+def network_layout(edges, iterations=100, seed=0):
+    """Force-directed layout (Fruchterman-Reingold) of nodes connected by the edges.
+
+    Args:
+        edges (DataFrame): Edges from correlation_edges
+        iterations (int): Number of layout steps
+        seed (int): Seed of initial positions
+
+    Returns:
+        DataFrame: Columns x, y and Degree indexed by node name
+    """
+    nodes = pd.Index(pd.unique(np.concatenate([edges["Source"].to_numpy(), edges["Target"].to_numpy()])))
+    sources, targets = nodes.get_indexer(edges["Source"]), nodes.get_indexer(edges["Target"])
+    weights = np.abs(edges["Weight"].to_numpy())
+
+    rng = np.random.default_rng(seed)
+    positions = rng.random((len(nodes), 2))
+    optimal = 1 / np.sqrt(max(len(nodes), 1))
+    temperature = 0.1
+
+    for _ in range(iterations):
+        # Repulsion of all pairs of nodes, sum of (p_i - p_j) / d_ij^2 written as matrix products
+        squared = (positions**2).sum(axis=1)
+        inverse = 1 / np.maximum(squared[:, None] + squared[None, :] - 2 * positions @ positions.T, 1e-8)
+        np.fill_diagonal(inverse, 0)
+        displacement = optimal**2 * (positions * inverse.sum(axis=1)[:, None] - inverse @ positions)
+
+        # Attraction along edges, stronger edges pull more
+        edge_delta = positions[sources] - positions[targets]
+        edge_distance = np.maximum(np.sqrt((edge_delta**2).sum(axis=1)), 1e-4)
+        pull = edge_delta * (weights * edge_distance / optimal)[:, None]
+        np.add.at(displacement, sources, -pull)
+        np.add.at(displacement, targets, pull)
+
+        length = np.maximum(np.sqrt((displacement**2).sum(axis=1)), 1e-9)
+        positions += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.97
+
+    degree = np.bincount(np.concatenate([sources, targets]), minlength=len(nodes))
+    return pd.DataFrame({"x": positions[:, 0], "y": positions[:, 1], "Degree": degree}, index=nodes)
@@ -0,0 +1,112 @@
+# Import libraries
+import numpy as np
+import pandas as pd
+from scipy.optimize import isotonic_regression
+from scipy.spatial.distance import pdist, squareform
+
+from utils.parallel import attach_array, shared_array, submit_task
+
+
+# Problems smaller than this (samples^2 x starts) are computed without a process pool
+NMDS_PARALLEL_MIN_WORK = 10**6
+
+
+# Function to run non-metric SMACOF from one starting configuration
+def _nmds_start(dimensions, seed_sequence, dissimilarities, max_iter=300, eps=1e-4):
+    """Minimizes Kruskal stress-1 by SMACOF iterations alternating with monotone (isotonic)
+    regression of distances on the order of dissimilarities.
+
+    Args:
+        dimensions (int): Number of dimensions of the ordination
+        seed_sequence (SeedSequence): Seed of the random starting configuration
+        dissimilarities (ndarray): Condensed distance matrix
+        max_iter (int): Maximal number of iterations
+        eps (float): Relative decrease of stress considered as convergence
+
+    Returns:
+        tuple: Coordinates, stress, number of iterations and whether the start converged
+    """
+    n_samples = int(round((1 + np.sqrt(1 + 8 * len(dissimilarities))) / 2))
+    order = np.argsort(dissimilarities, kind="stable")
+    coordinates = np.random.default_rng(seed_sequence).standard_normal((n_samples, dimensions))
+
+    stress, converged = np.inf, False
+    for iteration in range(1, max_iter + 1):
+        distances = pdist(coordinates)
+
+        # Disparities: distances made monotone in the order of dissimilarities
+        disparities = np.empty_like(distances)
+        disparities[order] = isotonic_regression(distances[order]).x
+        disparities *= np.sqrt(len(distances) / max((disparities**2).sum(), 1e-12))
+
+        new_stress = np.sqrt(((distances - disparities)**2).sum() / max((distances**2).sum(), 1e-12))
+        if stress - new_stress < eps * stress or new_stress < 1e-6:
+            converged = True
+            stress = min(stress, new_stress)
+            break
+        stress = new_stress
+
+        # Guttman transform
+        ratio = np.divide(disparities, distances, out=np.zeros_like(distances), where=distances > 0)
+        b_matrix = -squareform(ratio)
+        b_matrix[np.diag_indices(n_samples)] = -b_matrix.sum(axis=1)
+        coordinates = b_matrix @ coordinates / n_samples
+
+    return coordinates, stress, iteration, converged
+
+
+# Function to run one start in a worker process
+def _shared_nmds_start(dimensions, seed_sequence, shared_dissimilarities):
+    return _nmds_start(dimensions, seed_sequence, attach_array(shared_dissimilarities))
+
+
+# Function to compute NMDS ordination
+def nmds(distances, dimensions=3, n_starts=20, seed=0, job=None):
+    """Non-metric multidimensional scaling of the distance matrix. Every start begins from
+    random configuration with own seed spawned from the seed, starts run in the process pool
+    shared by all jobs for large matrices and the solution with the lowest stress is kept.
+
+    Args:
+        distances (DataFrame): Symmetric distance matrix with samples in index and columns
+        dimensions (int): Number of dimensions of the ordination
+        n_starts (int): Number of random starts
+        seed (int): Seed of random starts
+        job (Job, optional): Background job used to report progress
+
+    Returns:
+        tuple: Coordinates (samples x NMDS1..NMDSk) and dictionary with stress and convergence
+    """
+    dissimilarities = squareform(distances.to_numpy(dtype=float), checks=False)
+    seeds = np.random.SeedSequence(seed).spawn(n_starts)
+
+    if len(distances)**2 * n_starts < NMDS_PARALLEL_MIN_WORK:
+        results = []
+        for start, seed_sequence in enumerate(seeds, start=1):
+            results.append(_nmds_start(dimensions, seed_sequence, dissimilarities))
+            if job is not None:
+                job.report(start / n_starts, f"Finished {start} of {n_starts} starts...")
+    else:
+        with shared_array(dissimilarities) as shared_dissimilarities:
+            futures = [submit_task(_shared_nmds_start, dimensions, seed_sequence, shared_dissimilarities) for seed_sequence in seeds]
+            try:
+                results = []
+                for start, future in enumerate(futures, start=1):
+                    results.append(future.result())
+                    if job is not None:
+                        job.report(start / n_starts, f"Finished {start} of {n_starts} starts...")
+            except BaseException:
+                # Remaining starts of cancelled job are not started, the pool is shared with other jobs
+                for future in futures:
+                    future.cancel()
+                raise
+
+    best = int(np.argmin([stress for _, stress, _, _ in results]))
+    coordinates, stress, iterations, converged = results[best]
+    columns = [f"NMDS{axis + 1}" for axis in range(dimensions)]
+    info = {"stress": float(stress),
+            "iterations": int(iterations),
+            "converged": bool(converged),
+            "starts": n_starts,
+            "converged starts": int(sum(result[3] for result in results)),
+            "best start": best + 1}
+    return pd.DataFrame(coordinates, index=distances.index, columns=columns), info
@@ -0,0 +1,159 @@
+# Import libraries
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory, spawn
+
+import numpy as np
+
+
+# Workers are started by a fork server, forking the multithreaded server could deadlock in the child
+PROCESS_START_METHOD = "forkserver"
+
+# Modules imported once by the fork server instead of by every worker process
+WORKER_PRELOAD = ["utils.parallel", "numpy", "pandas", "scipy.spatial.distance", "skbio.diversity", "skbio.stats.ordination", "dash_bio"]
+
+# Number of shared arrays kept attached by one worker process
+WORKER_ATTACHED_ARRAYS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Held while processes are started without the main module
+_start_lock = threading.Lock()
+
+# Shared memory attached by a worker process
+_attached = OrderedDict()
+
+
+# Function to start processes which do not run the page script
+@contextmanager
+def _without_main_module():
+    """Streamlit runs the page script as module __main__ with its path in __file__, so every
+    process started by the fork server would import the script and run the whole page again.
+    multiprocessing has no option to skip the main module, so its get_preparation_data is
+    replaced by a version leaving the main module out only while processes are started in
+    the block, and restored afterwards. Other threads do not start processes meanwhile.
+    """
+    with _start_lock:
+        preparation_data = spawn.get_preparation_data
+
+        def without_main(name):
+            data = preparation_data(name)
+            data.pop("init_main_from_path", None)
+            data.pop("init_main_from_name", None)
+            return data
+
+        spawn.get_preparation_data = without_main
+        try:
+            yield
+        finally:
+            spawn.get_preparation_data = preparation_data
+
+
+# Function to get start context of worker processes
+def process_context():
+    context = multiprocessing.get_context(PROCESS_START_METHOD)
+    # Fork server gets sys.path of the server only with preloaded modules
+    context.set_forkserver_preload(WORKER_PRELOAD)
+    return context
+
+
+# Function to run the computation in a process of its own
+def _process_main(connection, func, args, kwargs):
+    try:
+        connection.send((True, func(*args, **kwargs)))
+    except BaseException as error:
+        connection.send((False, error))
+    finally:
+        connection.close()
+
+
+# Function to start computation in a separate process
+def start_process(func, args, kwargs):
+    """Starts process computing func(*args, **kwargs), which can be terminated at any time.
+
+    Returns:
+        tuple: Process and connection receiving pair of success flag and result (or error)
+    """
+    context = process_context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_process_main, args=(sender, func, args, kwargs), daemon=True)
+    with _without_main_module():
+        process.start()
+    sender.close()
+    return process, receiver
+
+
+# Function to run task in the process pool shared by all jobs
+def submit_task(func, *args):
+    """Submits func(*args) to the process pool created on first use. Jobs share its cpu_count
+    workers instead of starting own pools, a pool broken by a killed worker is replaced.
+
+    Returns:
+        Future: Future of the task
+    """
+    global _pool
+    with _pool_lock:
+        for _ in range(2):
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=process_context())
+            try:
+                # Workers are started by submit
+                with _without_main_module():
+                    return _pool.submit(func, *args)
+            except BrokenProcessPool:
+                _pool = None
+        raise BrokenProcessPool("Process pool can not be started.")
+
+
+# Function to share array with worker processes
+@contextmanager
+def shared_array(values):
+    """Copies the array to shared memory for the duration of the block. Tasks receive the
+    returned description and attach the memory instead of receiving a copy of the array.
+
+    Args:
+        values (ndarray): Array to share
+
+    Yields:
+        tuple: Name of shared memory, shape and dtype for attach_array
+    """
+    values = np.ascontiguousarray(values)
+    memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        view = np.ndarray(values.shape, values.dtype, buffer=memory.buf)
+        view[...] = values
+        del view
+        yield (memory.name, values.shape, values.dtype.str)
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+# Function to read shared array in a worker process
+def attach_array(description):
+    """Returns array from shared memory, memory stays attached for following tasks.
+
+    Args:
+        description (tuple): Description from shared_array
+
+    Returns:
+        ndarray: Read-only view of the shared array
+    """
+    name, shape, dtype = description
+    memory = _attached.get(name)
+    if memory is None:
+        memory = shared_memory.SharedMemory(name=name)
+        _attached[name] = memory
+        while len(_attached) > WORKER_ATTACHED_ARRAYS:
+            _attached.popitem(last=False)[1].close()
+    _attached.move_to_end(name)
+
+    values = np.ndarray(shape, dtype, buffer=memory.buf)
+    values.flags.writeable = False
+    return values
@@ -0,0 +1,130 @@
+# Import libraries
+import gzip
+
+import streamlit as st
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# Rows of features without a group and rows kept under their own name (HUMAnN conventions)
+UNGROUPED = "UNGROUPED"
+KEPT_ROWS = ["UNMAPPED"]
+
+# Number of mapping matrices and regrouped tables kept in memory, one per table and mapping file
+REGROUP_CACHE_SIZE = 4
+
+
+# Function to parse mapping file of HUMAnN utility mapping format
+def parse_mapping(content):
+    """Parses mapping with one group per line followed by its members separated by tabs,
+    e.g. "1.1.1.1<tab>UniRef90_A<tab>UniRef90_B". Gzipped files are accepted.
+
+    Args:
+        content (bytes): Content of the mapping file
+
+    Returns:
+        DataFrame: Pairs of Feature and Group, a feature may belong to several groups
+    """
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+
+    groups, features = [], []
+    for line in content.decode().splitlines():
+        if not line or line.startswith("#"):
+            continue
+        parts = line.rstrip("\t").split("\t")
+        groups.extend([parts[0]] * (len(parts) - 1))
+        features.extend(parts[1:])
+    return pd.DataFrame({"Feature": features, "Group": groups}).drop_duplicates()
+
+
+# Function to build sparse matrix summing features into groups
+def build_regroup_matrix(row_names, mapping):
+    """Maps every row to rows of groups of its feature. Stratified rows (feature|taxon) map to
+    group|taxon, features without a group are summed into UNGROUPED (per taxon).
+
+    Args:
+        row_names (Index): Names of rows of the genefamilies table
+        mapping (DataFrame): Pairs of Feature and Group from parse_mapping
+
+    Returns:
+        tuple: Sparse matrix (groups x rows) of zeros and ones and names of group rows
+    """
+    names = pd.Series(np.asarray(row_names.astype(str)))
+    parts = names.str.split("|", n=1, expand=True)
+    if 1 in parts:
+        suffixes = np.where(parts[1].notna(), "|" + parts[1].fillna(""), "")
+    else:
+        suffixes = np.full(len(names), "", dtype=object)
+
+    # Unstratified and stratified rows of one feature share its groups
+    pairs = pd.DataFrame({"Row": np.arange(len(names)), "Feature": parts[0]}).merge(mapping, on="Feature", how="left")
+    groups = pairs["Group"].fillna(UNGROUPED).where(~pairs["Feature"].isin(KEPT_ROWS), pairs["Feature"])
+    rows = pairs["Row"].to_numpy()
+
+    codes, group_names = pd.factorize(groups.to_numpy(dtype=object) + suffixes[rows].astype(object), sort=True)
+    matrix = sparse.csr_matrix((np.ones(len(pairs)), (codes, rows)), shape=(len(group_names), len(names)))
+    return matrix, pd.Index(group_names)
+
+
+# Cached version of the matrix, built once per table and mapping file
+@st.cache_resource(show_spinner="Building mapping of features to groups...", max_entries=REGROUP_CACHE_SIZE)
+def regroup_matrix(table, mapping_content):
+    return build_regroup_matrix(table.index, parse_mapping(mapping_content))
+
+
+# Function to sum abundances of features into groups
+@st.cache_data(show_spinner="Regrouping gene families...", max_entries=REGROUP_CACHE_SIZE)
+def regroup_table(table, mapping_content):
+    """Regroups rows of the table by sparse matrix product with the mapping matrix.
+
+    Args:
+        table (DataFrame): Genefamilies table with features in rows and samples in columns
+        mapping_content (bytes): Content of the mapping file
+
+    Returns:
+        DataFrame: Table with groups in rows
+    """
+    matrix, group_names = regroup_matrix(table, mapping_content)
+    regrouped = pd.DataFrame(matrix @ table.to_numpy(dtype=float), index=group_names, columns=table.columns)
+    regrouped.index.name = table.index.name
+    return regrouped
+
+
+# Function to show regrouping settings shared by pages
+def regroup_sidebar(select_file):
+    """Shows uploader of mapping files and selection of grouping for genefamilies tables.
+    Mapping files and the selection are stored in session state, so Graphs and Statistics
+    use the same grouping.
+
+    Args:
+        select_file (str): Name of selected file
+
+    Returns:
+        bytes: Content of selected mapping file or None to keep gene families
+    """
+    if "mapping_files" not in st.session_state:
+        st.session_state.mapping_files = {}
+    if "regroup" not in st.session_state:
+        st.session_state.regroup = "Gene families"
+
+    if "genefamilies" not in select_file:
+        return None
+
+    with st.sidebar.expander("Regroup gene families"):
+        uploaded_mappings = st.file_uploader("Upload mapping files:", accept_multiple_files=True,
+                                             help="HUMAnN utility mapping files (e.g. map_level4ec_uniref90.txt.gz), every line holds a group (EC, KO, GO, Pfam...) followed by its gene families separated by tabs.")
+        for uploaded_mapping in uploaded_mappings or []:
+            if uploaded_mapping.name not in st.session_state.mapping_files:
+                st.session_state.mapping_files[uploaded_mapping.name] = uploaded_mapping.getvalue()
+
+        options = ["Gene families"] + list(st.session_state.mapping_files)
+        index = options.index(st.session_state.regroup) if st.session_state.regroup in options else 0
+        st.session_state.regroup = st.selectbox("Group by:", options=options, index=index,
+                                                help="Sums gene families into groups of the mapping file, features without a group are summed into UNGROUPED.")
+
+    if st.session_state.regroup == "Gene families":
+        return None
+    return st.session_state.mapping_files[st.session_state.regroup]
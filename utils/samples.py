@@ -0,0 +1,150 @@
+# Import libraries
+import hashlib
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+import numpy as np
+import pandas as pd
+
+
+# Number of per-sample values and distance matrices kept in memory
+SAMPLE_CACHE_SIZE = 100000
+DISTANCE_CACHE_SIZE = 8
+
+_value_cache = OrderedDict()
+_distance_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# Function to get sample name of a column, metadata are indexed by the part before "_"
+def sample_name(column):
+    return str(column).split("_")[0]
+
+
+# Function to show sample filter shared by pages
+def sample_filter_sidebar():
+    """Shows metadata values to keep in the sidebar. Selected values are stored in session
+    state, so all pages analyse the same samples. Nothing is shown before metadata are uploaded.
+
+    Returns:
+        dict: Selected values per metadata column, empty selection keeps all samples
+    """
+    if "sample_filter" not in st.session_state:
+        st.session_state.sample_filter = {}
+    selection = st.session_state.sample_filter
+
+    metadata = st.session_state.get("metadata")
+    if metadata is None:
+        return selection
+
+    with st.sidebar.expander("Sample filter"):
+        for column in metadata.columns:
+            options = sorted(metadata[column].dropna().unique().tolist(), key=str)
+            selection[column] = st.multiselect(str(column), options=options, default=[value for value in selection.get(column, []) if value in options],
+                                               help="Keeps only samples with one of these values, all samples are kept when nothing is selected.")
+    return selection
+
+
+# Function to keep samples (columns) matching the sample filter
+def select_samples(table, metadata, selection):
+    """Slices columns of samples whose metadata match all selected values. The table is
+    returned unchanged when nothing is selected, so results cached for it stay valid.
+
+    Args:
+        table (DataFrame): Table with features in rows and samples in columns
+        metadata (DataFrame): Metadata indexed by sample name, may be None
+        selection (dict): Selected values per metadata column
+
+    Returns:
+        DataFrame: Table with selected samples
+    """
+    active = {column: values for column, values in selection.items() if values and metadata is not None and column in metadata}
+    if not active:
+        return table
+
+    keep = np.ones(len(metadata), dtype=bool)
+    for column, values in active.items():
+        keep &= metadata[column].isin(values).to_numpy()
+    samples = set(metadata.index[keep].astype(str))
+    return table[[column for column in table.columns if sample_name(column) in samples]]
+
+
+# Function to print how many samples are analysed
+def show_sample_report(table, selected):
+    if selected is not table:
+        st.sidebar.caption(f"Sample filter keeps {selected.shape[1]} of {table.shape[1]} samples.")
+
+
+# Function to hash values of every column
+def _column_digests(table):
+    features = hashlib.sha1(pd.util.hash_pandas_object(table.index, index=False).to_numpy().tobytes()).digest()
+    values = np.ascontiguousarray(table.to_numpy(dtype=float).T)
+    return [hashlib.sha1(features + str(column).encode() + row.tobytes()).hexdigest() for column, row in zip(table.columns, values)]
+
+
+# Function to compute a value of every sample, values of samples seen before are reused
+def per_sample(func, table, *args):
+    """Applies func to every column. Results are cached by content of the column, so a subset
+    of samples reuses values computed for the whole table and vice versa.
+
+    Args:
+        func (function): Function of one column (Series) and args returning one value
+        table (DataFrame): Table with features in rows and samples in columns
+
+    Returns:
+        Series: Value per column
+    """
+    keys = [(func.__name__, args, digest) for digest in _column_digests(table)]
+    values = {}
+    with _cache_lock:
+        for key in keys:
+            if key in _value_cache:
+                _value_cache.move_to_end(key)
+                values[key] = _value_cache[key]
+
+    missing = {key: column for key, column in zip(keys, table.columns) if key not in values}
+    computed = {key: func(table[column], *args) for key, column in missing.items()}
+
+    with _cache_lock:
+        _value_cache.update(computed)
+        while len(_value_cache) > SAMPLE_CACHE_SIZE:
+            _value_cache.popitem(last=False)
+    values.update(computed)
+    return pd.Series([values[key] for key in keys], index=table.columns, dtype=float)
+
+
+# Function to get pairwise distances of samples, matrices of supersets are sliced
+def subset_distances(table, metric, compute):
+    """Returns distances between samples (rows). Distance of two samples depends only on their
+    own abundances over the same features, so a matrix computed for a superset of samples
+    over the same features is sliced instead of computing a new one.
+
+    Args:
+        table (DataFrame): Transposed table (samples in rows, features in columns)
+        metric (str): Name of the metric, part of the cache key
+        compute (function): Function returning DistanceMatrix of all rows of the table
+
+    Returns:
+        ndarray: Square matrix of distances in the order of rows
+    """
+    features = hashlib.sha1(pd.util.hash_pandas_object(table.columns, index=False).to_numpy().tobytes()).hexdigest()
+    digests = _column_digests(table.T)
+
+    with _cache_lock:
+        for (cached_metric, cached_features), (positions, data) in reversed(_distance_cache.items()):
+            if cached_metric == metric and cached_features == features and all(digest in positions for digest in digests):
+                rows = [positions[digest] for digest in digests]
+                return data[np.ix_(rows, rows)]
+
+    distance_matrix = compute()
+    with _cache_lock:
+        # One matrix per metric and features, the largest set of samples is kept
+        key = (metric, features)
+        if key not in _distance_cache or len(_distance_cache[key][0]) <= len(digests):
+            _distance_cache[key] = ({digest: position for position, digest in enumerate(digests)}, distance_matrix.data)
+        _distance_cache.move_to_end(key)
+        while len(_distance_cache) > DISTANCE_CACHE_SIZE:
+            _distance_cache.popitem(last=False)
+    return distance_matrix.data
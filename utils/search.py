@@ -0,0 +1,169 @@
+# Import libraries
+import streamlit as st
+
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+
+# Length of n-grams in the substring index
+NGRAM = 3
+
+# Number of rows whose n-grams are collected at once, limits memory of indexing
+SEARCH_CHUNK_ROWS = 65536
+
+# Number of shortest posting lists intersected for a query
+SEARCH_MAX_LISTS = 3
+
+# Number of indexes kept in memory, every table and list of searched rows has its own
+SEARCH_INDEX_CACHE_SIZE = 8
+
+
+# Function to encode names to fixed-width byte strings
+def _encode_names(row_names):
+    lowered = pd.Index(row_names).astype(str).str.lower()
+    return np.asarray(lowered.str.encode("utf-8").to_numpy(), dtype=bytes) if len(lowered) else np.array([], dtype="S1")
+
+
+# Function to collect unique (n-gram, row) pairs of a block of rows
+def _block_grams(names, start):
+    """Codes every trigram of the rows as 24-bit integer of its bytes and returns keys
+    (code << 32 | row) without repeated trigrams of a row, sorted by code and row."""
+    block = names.view(np.uint8).reshape(len(names), names.itemsize).astype(np.uint32)
+    if block.shape[1] < NGRAM:
+        return np.array([], dtype=np.uint64)
+
+    codes = (block[:, :-2] << 16) | (block[:, 1:-1] << 8) | block[:, 2:]
+    # Names are padded by zero bytes, n-gram lies inside the name when its last byte is not zero
+    valid = block[:, 2:] != 0
+    rows = np.broadcast_to(np.arange(start, start + len(names), dtype=np.uint64)[:, None], codes.shape)
+    keys = np.sort((codes[valid].astype(np.uint64) << np.uint64(32)) | rows[valid])
+    return keys[np.append(True, keys[1:] != keys[:-1])] if len(keys) else keys
+
+
+# Function to build search index over row names
+def build_search_index(row_names):
+    """Builds index over row names, which is n-gram (trigram) inverted index for substring
+    queries and sorted array of names for prefix queries. Names are handled as fixed-width
+    byte arrays, so no Python object is created per row or n-gram. Search is case insensitive.
+
+    Args:
+        row_names (Index): Row names (index) of the table
+
+    Returns:
+        dict: Arrays of the index (names, n-gram codes with offsets to postings, sorted names)
+    """
+    names = _encode_names(row_names)
+    keys = [_block_grams(names[start:start + SEARCH_CHUNK_ROWS], start) for start in range(0, len(names), SEARCH_CHUNK_ROWS)]
+
+    # Blocks hold different rows, sorting concatenated keys orders pairs by n-gram and row
+    keys = np.sort(np.concatenate(keys)) if keys else np.array([], dtype=np.uint64)
+    codes = (keys >> np.uint64(32)).astype(np.uint32)
+    starts = np.flatnonzero(np.append(True, codes[1:] != codes[:-1])) if len(codes) else np.array([], dtype=np.int64)
+    grams = codes[starts]
+
+    sorted_order = np.argsort(names, kind="stable")
+    lengths = np.char.str_len(names) if len(names) else np.array([], dtype=np.int64)
+    return {"names": names,
+            "grams": grams,
+            "offsets": np.append(starts, len(codes)),
+            "postings": (keys & np.uint64(0xFFFFFFFF)).astype(np.int32 if len(names) < 2**31 else np.int64),
+            "short_rows": np.flatnonzero(lengths < NGRAM),
+            "sorted_order": sorted_order,
+            "sorted_names": names[sorted_order]}
+
+
+# Function to join posting lists of several n-grams
+def _postings(index, positions):
+    starts, stops = index["offsets"][positions], index["offsets"][positions + 1]
+    lengths = stops - starts
+    if not lengths.sum():
+        return np.array([], dtype=np.int64)
+    # Positions of all postings of the n-grams without a loop over n-grams
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return index["postings"][shifts + np.arange(lengths.sum())]
+
+
+# Cached version of the index, built once per table
+def search_index(row_names):
+    # Streamlit hashes Series but not Index
+    return _cached_search_index(pd.Series(row_names))
+
+
+@st.cache_resource(show_spinner="Indexing row names...", max_entries=SEARCH_INDEX_CACHE_SIZE)
+def _cached_search_index(row_names):
+    return build_search_index(row_names)
+
+
+# Function to find rows matching the query
+def search_rows(index, query, mode="Substring"):
+    """Finds rows whose name contains (or starts with) the query.
+
+    Args:
+        index (dict): Index from build_search_index
+        query (str): Searched text
+        mode (str): "Substring" or "Prefix"
+
+    Returns:
+        ndarray: Sorted positions of matching rows
+    """
+    query = query.strip().lower().encode("utf-8")
+    names = index["names"]
+
+    if mode == "Prefix":
+        low = np.searchsorted(index["sorted_names"], query, side="left")
+        high = np.searchsorted(index["sorted_names"], query + b"\xff", side="left")
+        return np.sort(index["sorted_order"][low:high]).astype(np.int64)
+
+    grams = index["grams"]
+    if len(query) < NGRAM:
+        # Every name of n-gram length containing the shorter query has an n-gram containing it
+        parts = [(grams >> 16) & 255, (grams >> 8) & 255, grams & 255]
+        contains = np.zeros(len(grams), dtype=bool)
+        for shift in range(NGRAM - len(query) + 1):
+            contains |= np.logical_and.reduce([parts[shift + i] == byte for i, byte in enumerate(query)])
+
+        matches = np.zeros(len(names), dtype=bool)
+        matches[_postings(index, np.flatnonzero(contains))] = True
+        short_rows = index["short_rows"]
+        matches[short_rows] = np.char.find(names[short_rows], query) >= 0
+        return np.flatnonzero(matches)
+
+    query_grams = np.unique([(query[i] << 16) | (query[i + 1] << 8) | query[i + 2] for i in range(len(query) - NGRAM + 1)]).astype(np.uint32)
+    positions = np.searchsorted(grams, query_grams)
+    if (positions >= len(grams)).any() or (grams[np.minimum(positions, len(grams) - 1)] != query_grams).any():
+        return np.array([], dtype=np.int64)
+
+    # Intersect the shortest posting lists, long lists of common n-grams are left to verification
+    lengths = index["offsets"][positions + 1] - index["offsets"][positions]
+    postings = [_postings(index, np.array([position])) for position in positions[np.argsort(lengths)][:SEARCH_MAX_LISTS]]
+    candidates = reduce(lambda left, right: np.intersect1d(left, right, assume_unique=True), postings)
+
+    # N-grams can match at different places, verify candidates
+    return candidates[np.char.find(names[candidates], query) >= 0].astype(np.int64)
+
+
+# Function to find matching rows of a table derived from the indexed one
+def subset_rows(matching_rows, indexed_names, row_names):
+    """Maps rows matching in the indexed table to positions in a table with (some of)
+    the same row names, e.g. after normalization, roll-up or filtering of rows.
+
+    Args:
+        matching_rows (ndarray): Positions from search_rows on the indexed table
+        indexed_names (Index): Row names of the indexed table
+        row_names (Index): Row names of the derived table
+
+    Returns:
+        ndarray: Sorted positions in the derived table or None when it has other names
+    """
+    if row_names.equals(indexed_names):
+        return matching_rows
+    if not indexed_names.is_unique:
+        return None
+    positions = indexed_names.get_indexer(row_names)
+    if (positions < 0).any():
+        return None
+    matches = np.zeros(len(indexed_names), dtype=bool)
+    matches[matching_rows] = True
+    return np.flatnonzero(matches[positions])
@@ -0,0 +1,197 @@
+# Import libraries
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+# Memory for chunks of features sketched at the same time
+SKETCH_MEMORY_BYTES = 256 * 2**20
+
+# Arrays of features x hash functions alive at once while one chunk is sketched (variates of ICWS and their products)
+SKETCH_CHUNK_ARRAYS = 8
+
+# Number of samples shown in heatmap of estimated distances
+SKETCH_HEATMAP_SAMPLES = 500
+
+# Number of sample sketches kept in memory
+SKETCH_CACHE_SIZE = 100000
+
+_sketch_cache = OrderedDict()
+_sketch_lock = threading.Lock()
+
+
+# Function to mix 64-bit integers into pseudo-random hashes
+def _splitmix64(values):
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+# Function to turn hashes into uniform numbers from (0, 1)
+def _uniform(hashes):
+    return ((hashes >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0**-53
+
+
+# Function to create seeds of hash functions
+def _hash_seeds(n_hashes, seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, np.iinfo(np.uint64).max, size=(5, n_hashes), dtype=np.uint64, endpoint=True)
+
+
+# Function to sketch all samples on one chunk of features
+def _sketch_chunk(feature_hashes, values, seeds, weighted):
+    """MinHash of features present in samples or, if weighted, improved consistent weighted
+    sample (ICWS) of the abundances. Random variates of features are computed once and
+    shared by all samples.
+
+    Args:
+        feature_hashes (ndarray): Hashes of names of features in the chunk
+        values (ndarray): Abundances of these features (features x samples)
+        seeds (ndarray): Seeds of hash functions from _hash_seeds
+        weighted (bool): Weighted MinHash (ICWS) instead of MinHash
+
+    Returns:
+        tuple: Scores to minimize (None for MinHash, the sketch is the score) and partial
+            sketches, both samples x hash functions
+    """
+    n_samples, n_hashes = values.shape[1], seeds.shape[1]
+    columns = np.arange(n_hashes)
+    sketch = np.full((n_samples, n_hashes), np.iinfo(np.uint64).max, dtype=np.uint64)
+    chunk = feature_hashes[:, None]
+
+    if not weighted:
+        hashes = _splitmix64(chunk ^ seeds[0])
+        for sample in range(n_samples):
+            rows = np.flatnonzero(values[:, sample] > 0)
+            if len(rows):
+                sketch[sample] = hashes[rows].min(axis=0)
+        return None, sketch
+
+    # ICWS (Ioffe 2010): r, c ~ Gamma(2, 1), beta ~ Uniform(0, 1) per feature and hash
+    r = -np.log(_uniform(_splitmix64(chunk ^ seeds[0])) * _uniform(_splitmix64(chunk ^ seeds[1])))
+    log_c = np.log(-np.log(_uniform(_splitmix64(chunk ^ seeds[2])) * _uniform(_splitmix64(chunk ^ seeds[3]))))
+    beta = _uniform(_splitmix64(chunk ^ seeds[4]))
+
+    scores = np.full((n_samples, n_hashes), np.inf)
+    for sample in range(n_samples):
+        rows = np.flatnonzero(values[:, sample] > 0)
+        if not len(rows):
+            continue
+        t = np.floor(np.log(values[rows, sample])[:, None] / r[rows] + beta[rows])
+        log_a = log_c[rows] - r[rows] * (t - beta[rows] + 1)
+
+        # Keep (feature, t) with the lowest a for every hash function
+        best = log_a.argmin(axis=0)
+        scores[sample] = log_a[best, columns]
+        sketch[sample] = feature_hashes[rows[best]] ^ _splitmix64(t[best, columns].astype(np.int64).view(np.uint64))
+
+    return scores, sketch
+
+
+# Function to build sketches of all samples
+def sample_sketches(table, n_hashes=128, weighted=False, seed=0, job=None):
+    """Builds MinHash (presence/absence) or weighted MinHash (abundance) sketch of every
+    sample, chunks of features are processed in parallel. Features are identified by hash
+    of their name, so sketches of the same sample are reused between tables and subsets.
+
+    Args:
+        table (DataFrame): Table with features in rows and samples in columns
+        n_hashes (int): Size of sketches (number of hash functions)
+        weighted (bool): Weighted MinHash (ICWS) instead of MinHash
+        seed (int): Seed of hash functions
+        job (Job, optional): Background job used to report progress
+
+    Returns:
+        DataFrame: One row of n_hashes uint64 values per sample
+    """
+    feature_hashes = pd.util.hash_array(np.asarray(table.index.astype(str), dtype=object))
+    seeds = _hash_seeds(n_hashes, seed)
+    values = table.to_numpy(dtype=float)
+
+    # Sketches of samples seen before are taken from the cache
+    keys = []
+    for position in range(values.shape[1]):
+        present = values[:, position] > 0
+        digest = hashlib.sha1(feature_hashes[present].tobytes() + values[present, position].tobytes()).hexdigest()
+        keys.append((digest, n_hashes, weighted, seed))
+    with _sketch_lock:
+        sketches = [_sketch_cache.get(key) for key in keys]
+    missing = [position for position, sketch in enumerate(sketches) if sketch is None]
+
+    if missing:
+        missing_values = values[:, missing]
+
+        # Chunks of all workers fit into the memory limit together
+        workers = os.cpu_count() or 1
+        chunk_rows = max(1, SKETCH_MEMORY_BYTES // (8 * SKETCH_CHUNK_ARRAYS * n_hashes * workers))
+        starts = range(0, len(values), chunk_rows)
+        best_scores = np.full((len(missing), n_hashes), np.inf)
+        best_sketch = np.full((len(missing), n_hashes), np.iinfo(np.uint64).max, dtype=np.uint64)
+
+        def sketch_chunk(start):
+            stop = start + chunk_rows
+            return _sketch_chunk(feature_hashes[start:stop], missing_values[start:stop], seeds, weighted)
+
+        # Merge partial sketches of feature chunks, minimum over chunks is minimum over all features
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for finished, (scores, sketch) in enumerate(executor.map(sketch_chunk, starts), start=1):
+                if scores is None:
+                    best_sketch = np.minimum(best_sketch, sketch)
+                else:
+                    better = scores < best_scores
+                    best_scores[better] = scores[better]
+                    best_sketch[better] = sketch[better]
+                if job is not None:
+                    job.report(0.8 * finished / len(starts), f"Sketched {finished} of {len(starts)} feature chunks...")
+
+        with _sketch_lock:
+            for row, position in enumerate(missing):
+                sketches[position] = best_sketch[row]
+                _sketch_cache[keys[position]] = best_sketch[row]
+            while len(_sketch_cache) > SKETCH_CACHE_SIZE:
+                _sketch_cache.popitem(last=False)
+
+    return pd.DataFrame(np.vstack(sketches) if sketches else np.empty((0, n_hashes), dtype=np.uint64), index=table.columns)
+
+
+# Function to estimate distances between samples from sketches
+def sketch_distances(sketches, metric):
+    """Estimates Jaccard distance (from MinHash) or Bray-Curtis dissimilarity (from weighted
+    MinHash, BC = (1 - J_w) / (1 + J_w)) of all pairs of samples.
+
+    Args:
+        sketches (DataFrame): Sketches from sample_sketches
+        metric (str): "jaccard" or "braycurtis"
+
+    Returns:
+        DataFrame: Symmetric distance matrix with zero diagonal
+    """
+    values = sketches.to_numpy()
+    similarity = np.empty((len(values), len(values)))
+
+    # Compare blocks of samples with all samples, block takes at most ~32 MB
+    block_rows = max(1, (1 << 25) // max(values.size, 1))
+    for start in range(0, len(values), block_rows):
+        block = values[start:start + block_rows, None, :]
+        similarity[start:start + block_rows] = (block == values[None, :, :]).mean(axis=2)
+
+    if metric == "braycurtis":
+        distances = (1 - similarity) / (1 + similarity)
+    else:
+        distances = 1 - similarity
+
+    distances = (distances + distances.T) / 2
+    np.fill_diagonal(distances, 0)
+    return pd.DataFrame(distances, index=sketches.index, columns=sketches.index)
+
+
+# Function to give expected error of the estimate
+def sketch_standard_error(n_hashes):
+    """Maximal standard error of similarity estimated from sketch of given size."""
+    return 0.5 / np.sqrt(n_hashes)
@@ -0,0 +1,190 @@
+# Import libraries
+import streamlit as st
+
+import datetime
+import hashlib
+import json
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import plotly.graph_objects as go
+from skbio import DistanceMatrix
+from skbio.stats.ordination import OrdinationResults
+
+from utils.jobs import get_job_runner, restore_result, restored_jobs, session_id
+
+
+# Identification of the bundle format, bundles of other versions are refused
+SNAPSHOT_FORMAT = "visualization-dashboard-snapshot"
+SNAPSHOT_VERSION = 2
+
+
+# Parsed input files are not results of analyses, they are loaded again from the files
+SNAPSHOT_SKIPPED = {"loadTable"}
+
+
+# Function to turn result into arrays and description of its structure
+def _encode(value, arrays, prefix):
+    """Stores arrays of the value to the arrays dictionary under names starting with prefix.
+
+    Returns:
+        dict: JSON description used by _decode to rebuild the value
+    """
+    def array(name, values):
+        arrays[f"{prefix}.{name}"] = np.asarray(values)
+        return f"{prefix}.{name}"
+
+    def labels(name, index):
+        # Numeric labels keep their type, other labels are stored as strings
+        return {"values": array(name, index.to_numpy() if index.dtype.kind in "biuf" else index.astype(str)), "name": index.name}
+
+    if isinstance(value, pd.DataFrame):
+        # Columns are stored separately, so every column keeps its own type
+        return {"type": "DataFrame", "values": [array(f"column{i}", value.iloc[:, i].to_numpy()) for i in range(value.shape[1])],
+                "index": labels("index", value.index), "columns": labels("columns", value.columns)}
+    if isinstance(value, pd.Series):
+        return {"type": "Series", "values": array("values", value.to_numpy()),
+                "index": labels("index", value.index), "name": value.name}
+    if isinstance(value, np.ndarray):
+        return {"type": "ndarray", "values": array("values", value)}
+    if isinstance(value, DistanceMatrix):
+        return {"type": "DistanceMatrix", "values": array("values", value.data), "ids": array("ids", list(value.ids))}
+    if isinstance(value, OrdinationResults):
+        parts = {name: _encode(getattr(value, name), arrays, f"{prefix}.{name}")
+                 for name in ["eigvals", "samples", "proportion_explained"] if getattr(value, name) is not None}
+        return {"type": "OrdinationResults", "short_method_name": value.short_method_name,
+                "long_method_name": value.long_method_name, "parts": parts}
+    if isinstance(value, go.Figure):
+        return {"type": "Figure", "values": array("json", np.frombuffer(value.to_json().encode(), dtype=np.uint8))}
+    if isinstance(value, (tuple, list)):
+        return {"type": type(value).__name__, "items": [_encode(item, arrays, f"{prefix}.{i}") for i, item in enumerate(value)]}
+    if isinstance(value, dict):
+        return {"type": "dict", "keys": list(value), "items": [_encode(item, arrays, f"{prefix}.{i}") for i, item in enumerate(value.values())]}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {"type": "scalar", "value": value}
+    raise TypeError(f"Results of type {type(value).__name__} can not be saved to snapshot.")
+
+
+# Function to rebuild result from arrays
+def _decode(spec, arrays):
+    def labels(spec):
+        return pd.Index(arrays[spec["values"]], name=spec["name"])
+
+    match spec["type"]:
+        case "DataFrame":
+            frame = pd.DataFrame({i: arrays[name] for i, name in enumerate(spec["values"])}, index=labels(spec["index"]))
+            frame.columns = labels(spec["columns"])
+            return frame
+        case "Series":
+            return pd.Series(arrays[spec["values"]], index=labels(spec["index"]), name=spec["name"])
+        case "ndarray":
+            return arrays[spec["values"]]
+        case "DistanceMatrix":
+            return DistanceMatrix(arrays[spec["values"]], ids=list(arrays[spec["ids"]]))
+        case "OrdinationResults":
+            parts = {name: _decode(part, arrays) for name, part in spec["parts"].items()}
+            return OrdinationResults(spec["short_method_name"], spec["long_method_name"], **parts)
+        case "Figure":
+            return pio.from_json(arrays[spec["values"]].tobytes().decode())
+        case "tuple" | "list":
+            items = [_decode(item, arrays) for item in spec["items"]]
+            return tuple(items) if spec["type"] == "tuple" else items
+        case "dict":
+            return dict(zip(spec["keys"], (_decode(item, arrays) for item in spec["items"])))
+        case "scalar":
+            return spec["value"]
+    raise ValueError(f"Unknown type {spec['type']} in snapshot.")
+
+
+# Function to save finished jobs to a bundle
+def export_snapshot(jobs):
+    """Saves results of finished jobs to a compressed npz archive. Manifest in the archive
+    describes every result by name of the computation, hash of its inputs and parameters.
+
+    Args:
+        jobs (list): Finished jobs from JobRunner.finished
+
+    Returns:
+        bytes: Content of the archive
+    """
+    arrays, entries = {}, []
+    for position, job in enumerate(jobs):
+        try:
+            spec = _encode(job.result(), arrays, f"r{position}")
+        except TypeError:
+            continue
+        entries.append({"function": job.key[0], "fingerprint": job.key[1], "parameters": job.parameters, "result": spec})
+
+    # Object arrays would need pickle, labels are stored as unicode strings
+    for name, values in arrays.items():
+        if values.dtype == object:
+            arrays[name] = values.astype(str)
+
+    manifest = {"format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "checksums": {name: hashlib.sha1(np.ascontiguousarray(values).tobytes()).hexdigest() for name, values in arrays.items()},
+                "entries": entries}
+    arrays["manifest"] = np.frombuffer(json.dumps(manifest).encode(), dtype=np.uint8)
+
+    buffer = BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+# Function to load results from a bundle
+def import_snapshot(content):
+    """Reads archive written by export_snapshot.
+
+    Args:
+        content (bytes): Content of the archive
+
+    Returns:
+        tuple: List of (key, result, parameters) and the manifest
+    """
+    with np.load(BytesIO(content), allow_pickle=False) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+
+    manifest = json.loads(arrays.pop("manifest").tobytes().decode())
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("File is not a snapshot of this version of the dashboard.")
+    for name, checksum in manifest["checksums"].items():
+        if hashlib.sha1(np.ascontiguousarray(arrays[name]).tobytes()).hexdigest() != checksum:
+            raise ValueError(f"Snapshot is damaged, array {name} does not match its checksum.")
+
+    results = [((entry["function"], entry["fingerprint"]), _decode(entry["result"], arrays), entry["parameters"])
+               for entry in manifest["entries"]]
+    return results, manifest
+
+
+# Function to show export and import of snapshots in the sidebar
+def snapshot_sidebar():
+    """Exports results computed in this session and restores results from uploaded
+    snapshot. Restored results are used instead of computation with the same inputs, only
+    in the session which uploaded the snapshot."""
+    runner = get_job_runner()
+
+    with st.sidebar.expander("Snapshot"):
+        jobs = {job.key: job for job in runner.finished(session_id()) + restored_jobs() if job.key[0] not in SNAPSHOT_SKIPPED}
+        jobs = list(jobs.values())
+        if st.button("Prepare snapshot", disabled=not jobs, help="Saves computed results (normalized tables, diversity indexes, distance matrices, ordinations and clustergrams) of this session."):
+            st.session_state.snapshot = export_snapshot(jobs)
+        if st.session_state.get("snapshot") is not None:
+            st.download_button("Download snapshot", data=st.session_state.snapshot, file_name="dashboard_snapshot.npz",
+                               mime="application/octet-stream")
+
+        uploaded = st.file_uploader("Restore snapshot", type="npz", help="Results from the snapshot are shown instantly for the same files and settings.")
+        if uploaded is not None and st.session_state.get("snapshot_restored") != uploaded.file_id:
+            try:
+                results, manifest = import_snapshot(uploaded.getvalue())
+            except (ValueError, KeyError, OSError) as error:
+                st.error(f"Snapshot can not be restored: {error}")
+                return
+            for key, result, parameters in results:
+                restore_result(key, result, parameters)
+            st.session_state.snapshot_restored = uploaded.file_id
+            st.success(f"Restored {len(results)} results from snapshot created {manifest['created']}.")
@@ -0,0 +1,137 @@
+# Import libraries
+from concurrent.futures import as_completed
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+from utils.parallel import attach_array, shared_array, submit_task
+
+
+# Number of permutations evaluated by one task, fixed so results do not depend on number of workers
+PERMUTATION_CHUNK = 200
+
+# Problems smaller than this (samples^2 x permutations) are computed without a process pool
+PARALLEL_MIN_WORK = 2 * 10**8
+
+
+# Function to sum matrix values of pairs of samples within the same group
+def _within_sums(matrix, labels, n_groups):
+    """Sum of matrix[i, j] over pairs i < j with the same label, for a batch of labelings.
+    Labels are one-hot encoded, so all labelings are evaluated by one matrix product.
+
+    Args:
+        matrix (ndarray): Symmetric matrix with zero diagonal (samples x samples)
+        labels (ndarray): Group codes (labelings x samples)
+        n_groups (int): Number of groups
+
+    Returns:
+        ndarray: Within-group sums per labeling and group (labelings x groups)
+    """
+    one_hot = np.zeros((labels.shape[1], labels.shape[0] * n_groups))
+    one_hot[np.arange(labels.shape[1])[None, :], labels + np.arange(labels.shape[0])[:, None] * n_groups] = 1
+    products = (matrix @ one_hot) * one_hot
+    return products.sum(axis=0).reshape(labels.shape[0], n_groups) / 2
+
+
+# Function to compute test statistic from within-group sums
+def _statistic(method, within, group_sizes, total):
+    n_samples, n_groups = group_sizes.sum(), len(group_sizes)
+    if method == "PERMANOVA":
+        # pseudo-F, within sums are sums of squared distances
+        ss_within = (within / group_sizes).sum(axis=-1)
+        ss_total = total / n_samples
+        return ((ss_total - ss_within) / (n_groups - 1)) / (ss_within / (n_samples - n_groups))
+
+    # ANOSIM R, within sums are sums of ranks of distances
+    n_pairs = n_samples * (n_samples - 1) / 2
+    n_within = (group_sizes * (group_sizes - 1) / 2).sum()
+    within_sum = within.sum(axis=-1)
+    mean_within = within_sum / n_within
+    mean_between = (total - within_sum) / (n_pairs - n_within)
+    return (mean_between - mean_within) / (n_pairs / 2)
+
+
+# Function to evaluate one chunk of permutations
+def _permutation_chunk(method, codes, group_sizes, total, seed_sequence, n_permutations, matrix):
+    rng = np.random.default_rng(seed_sequence)
+    labels = rng.permuted(np.tile(codes, (n_permutations, 1)), axis=1)
+    return _statistic(method, _within_sums(matrix, labels, len(group_sizes)), group_sizes, total)
+
+
+# Function to evaluate one chunk of permutations in a worker process
+def _shared_permutation_chunk(method, codes, group_sizes, total, seed_sequence, n_permutations, shared_matrix):
+    return _permutation_chunk(method, codes, group_sizes, total, seed_sequence, n_permutations, attach_array(shared_matrix))
+
+
+# Function to test differences between groups of samples
+def permutation_test(distances, grouping, method="PERMANOVA", permutations=999, seed=0, job=None):
+    """PERMANOVA (pseudo-F of squared distances) or ANOSIM (R of ranked distances) with
+    p-value from permutations of group labels. Permutations are split to chunks with
+    independent seeds spawned from the seed, large problems are evaluated in the process pool
+    shared by all jobs, which reads the matrix from shared memory.
+
+    Args:
+        distances (DataFrame): Symmetric distance matrix with samples in index and columns
+        grouping (Series): Group of every sample, samples without group are left out
+        method (str): "PERMANOVA" or "ANOSIM"
+        permutations (int): Number of permutations
+        seed (int): Seed of random permutations
+        job (Job, optional): Background job used to report progress
+
+    Returns:
+        dict: Test statistic, p-value and sizes of the test
+    """
+    grouping = grouping.reindex(distances.index).dropna()
+    codes, groups = pd.factorize(grouping)
+    group_sizes = np.bincount(codes).astype(float)
+    if len(groups) < 2 or len(groups) == len(codes):
+        raise ValueError("Test requires at least two groups and at least one group with more than one sample.")
+
+    values = distances.loc[grouping.index, grouping.index].to_numpy(dtype=float)
+    if method == "PERMANOVA":
+        matrix = values**2
+    else:
+        upper = np.triu_indices(len(values), k=1)
+        matrix = np.zeros_like(values)
+        matrix[upper] = rankdata(values[upper])
+        matrix += matrix.T
+    total = np.triu(matrix, k=1).sum()
+
+    observed = float(_statistic(method, _within_sums(matrix, codes[None, :], len(groups))[0], group_sizes, total))
+
+    # Deterministic chunks, each with own seed
+    chunk_sizes = [min(PERMUTATION_CHUNK, permutations - start) for start in range(0, permutations, PERMUTATION_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    statistics = [None] * len(chunk_sizes)
+
+    if len(values)**2 * permutations < PARALLEL_MIN_WORK:
+        for position, (seed_sequence, size) in enumerate(zip(seeds, chunk_sizes)):
+            statistics[position] = _permutation_chunk(method, codes, group_sizes, total, seed_sequence, size, matrix)
+            if job is not None:
+                job.report((position + 1) / len(chunk_sizes), f"Evaluated {sum(chunk_sizes[:position + 1])} of {permutations} permutations...")
+    else:
+        with shared_array(matrix) as shared_matrix:
+            futures = {submit_task(_shared_permutation_chunk, method, codes, group_sizes, total, seed_sequence, size, shared_matrix): position
+                       for position, (seed_sequence, size) in enumerate(zip(seeds, chunk_sizes))}
+            try:
+                for finished, future in enumerate(as_completed(futures), start=1):
+                    statistics[futures[future]] = future.result()
+                    if job is not None:
+                        job.report(finished / len(chunk_sizes), f"Evaluated {finished} of {len(chunk_sizes)} permutation chunks...")
+            except BaseException:
+                # Remaining chunks of cancelled job are not started, the pool is shared with other jobs
+                for future in futures:
+                    future.cancel()
+                raise
+
+    permuted = np.concatenate(statistics) if statistics else np.empty(0)
+    p_value = float((np.sum(permuted >= observed - 1e-12 * abs(observed)) + 1) / (permutations + 1)) if permutations else None
+
+    return {"method name": method,
+            "test statistic name": "pseudo-F" if method == "PERMANOVA" else "R",
+            "sample size": len(codes),
+            "number of groups": len(groups),
+            "test statistic": observed,
+            "p-value": p_value,
+            "number of permutations": permutations}
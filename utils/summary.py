@@ -0,0 +1,88 @@
+# Import libraries
+import streamlit as st
+
+import numpy as np
+import pandas as pd
+
+
+# Statistics computed for every row of the table
+SUMMARY_COLUMNS = ["Mean abundance", "Median abundance", "Max abundance", "Variance", "Prevalence", "Total abundance"]
+
+
+# Function to compute summary statistics of all rows
+def compute_row_summary(table):
+    """Computes mean, median, max, variance, prevalence (fraction of non-zero samples)
+    and total of every row over the values of the whole table at once.
+
+    Args:
+        table (DataFrame): Whole table (file), normalized or not
+
+    Returns:
+        DataFrame: Table with one column per statistic, indexed as input table
+    """
+    values = table.select_dtypes("number").to_numpy(dtype=float)
+    n_samples = max(values.shape[1], 1)
+
+    total = values.sum(axis=1)
+    summary = pd.DataFrame({"Mean abundance": total / n_samples,
+                            "Median abundance": np.median(values, axis=1),
+                            "Max abundance": values.max(axis=1, initial=0),
+                            "Variance": values.var(axis=1, ddof=1) if values.shape[1] > 1 else np.zeros(len(values)),
+                            "Prevalence": np.count_nonzero(values, axis=1) / n_samples,
+                            "Total abundance": total},
+                           index=table.index)
+    return summary
+
+
+# Cached version of the summary, computed once per dataset and normalization
+@st.cache_data(show_spinner=False)
+def row_summary(table):
+    return compute_row_summary(table)
+
+
+# Function to normalize table to percentages
+def normalize_dataset(table):
+    """Whole input table is normalized to percentage by columns.
+
+    Args:
+        table (DataFrame): Whole uploaded table (file)
+
+    Returns:
+        DataFrame: Normalized table
+    """
+    # Loaded table is shared by sessions, it is not modified in place
+    return table.div(table.sum(), axis=1)*100
+
+
+# Function to get order of rows by one of the summary statistics
+def row_statistic_order(summary, statistic="Mean abundance", ascending=False):
+    """Returns positions of rows sorted by precomputed statistic. Ties keep their order and
+    missing values go last in both directions.
+
+    Args:
+        summary (DataFrame): Row statistics from row_summary
+        statistic (str): Name of statistic from SUMMARY_COLUMNS
+        ascending (bool): Sorting direction
+
+    Returns:
+        ndarray: Positions of rows in sorted order
+    """
+    values = pd.Series(summary[statistic].to_numpy())
+    return values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+
+
+# Function to sort table by one of the summary statistics
+def sort_by_row_statistic(dataframe, summary, statistic="Mean abundance", ascending=False):
+    """Sorts rows of DataFrame by precomputed statistic without adding it as column. Rows
+    are matched by position, so row names may repeat (gene families).
+
+    Args:
+        dataframe (DataFrame): Selected DataFrame
+        summary (DataFrame): Row statistics of the same DataFrame from row_summary
+        statistic (str): Name of statistic from SUMMARY_COLUMNS
+        ascending (bool): Sorting direction
+
+    Returns:
+        DataFrame: Sorted DataFrame
+    """
+    return dataframe.iloc[row_statistic_order(summary, statistic, ascending)]
@@ -0,0 +1,159 @@
+# Import libraries
+import streamlit as st
+
+import numpy as np
+import pandas as pd
+
+
+# Taxonomic ranks in the order they appear in MetaPhlAn lineages
+RANKS = ["k", "p", "c", "o", "f", "g", "s", "t"]
+
+RANK_NAMES = {"k": "Kingdom", "p": "Phylum", "c": "Class", "o": "Order",
+              "f": "Family", "g": "Genus", "s": "Species", "t": "Strain"}
+
+# Options of the taxonomic level select boxes mapped to rank
+METAPHLAN_LEVELS = {"Taxonomic Level 1 (Kingdom)": "k",
+                    "Taxonomic Level 2 (Phylum)": "p",
+                    "Taxonomic Level 3 (Class)": "c",
+                    "Taxonomic Level 4 (Order)": "o",
+                    "Taxonomic Level 5 (Family)": "f",
+                    "Taxonomic Level 6 (Genus)": "g",
+                    "Taxonomic Level 7 (Species)": "s"}
+
+
+# Function to parse lineages of all rows into the tree index
+def build_taxonomy_tree(row_names):
+    """Parses k__|p__|...|s__|t__ lineages of all rows once. Stratified HUMAnN rows
+    (UniRef90_X|g__Genus.s__species) are parsed by their taxon part.
+
+    Args:
+        row_names (Index): Row names (index) of the whole table
+
+    Returns:
+        tuple: (lineages, nodes) where lineages is DataFrame with one row per table row
+            holding lineage path on each rank plus Rank and Leaf columns, and nodes is
+            DataFrame indexed by lineage path with Name, Rank and Parent (parent pointer)
+            columns.
+    """
+    names = pd.Series(row_names.astype(str), index=row_names)
+    stratified = not names.str.startswith("k__").any()
+
+    # HUMAnN rows carry taxonomy after the first "|" as g__Genus.s__species
+    if stratified:
+        taxa = names.str.split("|", n=1).str[1].str.replace(".s__", "|s__", regex=False)
+    else:
+        taxa = names
+
+    parts = taxa.str.split("|", expand=True)
+    lineages = pd.DataFrame(index=row_names, columns=RANKS, dtype=object)
+
+    # Build lineage path on each depth and place it to the column of its rank
+    path = None
+    for depth in parts.columns:
+        part = parts[depth]
+        path = part if path is None else path + "|" + part
+        rank = part.str[0]
+        for letter in RANKS:
+            mask = ((rank == letter) & part.str[1:3].eq("__")).to_numpy()
+            if mask.any():
+                lineages.loc[mask, letter] = path[mask].to_numpy()
+
+    # Drop ranks which are not present in the table
+    lineages = lineages.loc[:, lineages.notna().any()]
+    rank_columns = list(lineages.columns)
+    present = lineages.notna().to_numpy()
+    has_rank = present.any(axis=1)
+    deepest = present.shape[1] - 1 - present[:, ::-1].argmax(axis=1)
+    own = lineages.to_numpy()[np.arange(len(lineages)), deepest]
+    lineages["Rank"] = np.where(has_rank, np.array(rank_columns, dtype=object)[deepest], None)
+
+    # Leaves are rows whose lineage is no other row's ancestor, roll-up sums only leaves
+    if stratified:
+        lineages["Leaf"] = has_rank
+    else:
+        above = present & (np.arange(present.shape[1]) < deepest[:, None])
+        ancestors = pd.Index(lineages[rank_columns].to_numpy()[above]).unique()
+        lineages["Leaf"] = has_rank & ~pd.Index(own).isin(ancestors)
+
+    # One node per unique lineage path with pointer to its parent
+    node_frames = []
+    for rank in rank_columns:
+        paths = pd.Index(lineages[rank].dropna().unique())
+        split = paths.str.rsplit("|", n=1)
+        node_frames.append(pd.DataFrame({"Name": split.str[-1],
+                                         "Rank": rank,
+                                         "Parent": np.where(split.str.len() > 1, split.str[0], "")},
+                                        index=paths))
+    nodes = pd.concat(node_frames) if node_frames else pd.DataFrame(columns=["Name", "Rank", "Parent"])
+    nodes.index.name = "Lineage"
+
+    return lineages, nodes
+
+
+# Cached version of the tree index, computed once per uploaded table
+def taxonomy_tree(row_names):
+    # Streamlit hashes Series but not Index
+    return _cached_taxonomy_tree(pd.Series(row_names))
+
+
+@st.cache_data(show_spinner=False)
+def _cached_taxonomy_tree(row_names):
+    return build_taxonomy_tree(pd.Index(row_names))
+
+
+# Function to aggregate abundances on any taxonomic rank
+def rollup_taxonomy(dataframe, lineages, rank, subtree=None):
+    """Sums leaf rows to selected rank with one vectorized group-sum.
+
+    Args:
+        dataframe (DataFrame): Whole table (file)
+        lineages (DataFrame): Lineages from build_taxonomy_tree
+        rank (str): Rank to aggregate to ("k", "p", ..., "t")
+        subtree (str, optional): Lineage path of node to restrict the roll-up to
+
+    Returns:
+        DataFrame: Abundances per lineage on selected rank
+    """
+    lineages = lineages.reindex(dataframe.index)
+    mask = lineages["Leaf"].fillna(False).to_numpy(dtype=bool)
+
+    if subtree is not None:
+        subtree_rank = subtree.rsplit("|", 1)[-1][0]
+        mask &= (lineages[subtree_rank] == subtree).to_numpy()
+
+    if rank not in lineages.columns:
+        return dataframe.iloc[:0]
+
+    keys = lineages[rank].to_numpy()[mask]
+    rollup = dataframe.iloc[mask].groupby(keys, sort=True).sum()
+    rollup.index.name = dataframe.index.name
+    return rollup
+
+
+# Function to compute values for sunburst/treemap
+def taxonomy_hierarchy(dataframe, lineages, nodes, max_rank, sample=None):
+    """Rolls abundances up to every rank down to max_rank and pairs them with parent pointers.
+
+    Args:
+        dataframe (DataFrame): Whole table (file)
+        lineages (DataFrame): Lineages from build_taxonomy_tree
+        nodes (DataFrame): Nodes from build_taxonomy_tree
+        max_rank (str): Deepest rank to include
+        sample (str, optional): Column to use, mean of all columns if not given
+
+    Returns:
+        DataFrame: Nodes with Value column, ready for plotly ids/parents/values
+    """
+    values = dataframe[sample] if sample is not None else dataframe.mean(axis=1)
+    values = values.to_frame("Value")
+
+    ranks = list(lineages.columns[:-2])
+    ranks = ranks[:ranks.index(max_rank) + 1] if max_rank in ranks else ranks
+
+    hierarchy = pd.concat([rollup_taxonomy(values, lineages, rank) for rank in ranks])
+    hierarchy = nodes.join(hierarchy, how="inner")
+    hierarchy = hierarchy[hierarchy["Value"] > 0]
+
+    # Nodes whose parent was dropped are attached to the root
+    hierarchy.loc[~hierarchy["Parent"].isin(hierarchy.index), "Parent"] = ""
+    return hierarchy